@@ -17,6 +17,9 @@ echo "Redis started"
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+echo "Rebuilding hot score index..."
+python manage.py rebuild_score_index
+
 echo "Starting server..."
 exec "$@"
 
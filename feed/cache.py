@@ -1,51 +1,252 @@
 import json
+import threading
 import time
+from collections import Counter, OrderedDict
 
 from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
 
-CACHE_KEY_TEMPLATE = "hotfeed:feed:hot:{limit}"
-LOCK_KEY_TEMPLATE = "hotfeed:lock:feed:hot:{limit}"
+# One canonical top-1000 feed serves every limit by slicing. Rendered response
+# bodies live in the same hash, one field per limit, so a hit returns stored
+# bytes and invalidation is still a single DEL.
+CACHE_KEY = "hotfeed:feed:hot"
+FEED_FIELD = "feed"
+VERSION_FIELD = "version"
+BODY_FIELD_TEMPLATE = "body:{limit}"
+LOCK_KEY = "hotfeed:lock:feed:hot"
+# Stale-while-revalidate: the feed is fresh while FRESH_KEY exists (soft TTL).
+# After that it is still served, while the lock holder refreshes it, until
+# the hash itself expires (hard TTL).
+FRESH_KEY = "hotfeed:feed:hot:fresh"
+# set_cached_feed publishes here so waiters wake up as soon as it runs.
+READY_CHANNEL = "hotfeed:feed:hot:ready"
 CACHE_TTL = 60
+CACHE_STALE_TTL = 300
+# Clients may reuse a fresh shared feed body for CACHE_TTL seconds and then
+# revalidate it with If-None-Match against feed_etag().
+FEED_CACHE_CONTROL = f"public, max-age={CACHE_TTL}"
+# Writes bump GENERATION_KEY and cut the remaining freshness down to
+# INVALIDATION_WINDOW seconds, so under write load the feed is rebuilt at
+# most once per window. A write is visible in Redis within
+# INVALIDATION_WINDOW plus one rebuild, and in every worker L1_TTL later.
+GENERATION_KEY = "hotfeed:feed:hot:generation"
+INVALIDATION_WINDOW = 2
 LOCK_TIMEOUT = 5
 LOCK_WAIT_TIMEOUT = 10
 
+# Per-process L1 in front of Redis: an LRU of rendered bodies keyed by limit.
+# An entry is served without asking Redis for L1_TTL seconds after it was
+# last checked against the feed version, so a worker never serves a body
+# that is more than L1_TTL behind Redis.
+L1_TTL = 1.0
+L1_MAX_SIZE = 128
 
-def get_cached_feed(limit):
-    key = CACHE_KEY_TEMPLATE.format(limit=limit)
-    data = cache.get(key)
+_l1 = OrderedDict()
+_l1_lock = threading.Lock()
+_l1_stats = Counter()
+
+INVALIDATE_SCRIPT = """
+redis.call("incr", KEYS[2])
+if redis.call("pttl", KEYS[1]) > tonumber(ARGV[1]) then
+    redis.call("pexpire", KEYS[1], ARGV[1])
+end
+"""
+
+# A feed built while writes kept coming is only fresh for one more window.
+MARK_FRESH_SCRIPT = """
+if (redis.call("get", KEYS[2]) or "0") == ARGV[1] then
+    redis.call("set", KEYS[1], 1, "EX", ARGV[2])
+elseif ARGV[3] ~= "0" then
+    redis.call("set", KEYS[1], 1, "PX", ARGV[3])
+else
+    redis.call("del", KEYS[1])
+end
+"""
+
+# Only attach a body to the feed it was rendered from.
+SET_BODY_SCRIPT = """
+if redis.call("hget", KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call("hset", KEYS[1], ARGV[3], ARGV[4])
+end
+return 0
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _get_fresh(field):
+    pipe = _redis().pipeline(transaction=False)
+    pipe.hget(CACHE_KEY, field)
+    pipe.exists(FRESH_KEY)
+    value, fresh = pipe.execute()
+    return value, bool(fresh)
+
+
+def get_cached_feed():
+    data, fresh = _get_fresh(FEED_FIELD)
     if data:
-        return json.loads(data)
-    return None
+        return json.loads(data), fresh
+    return None, False
+
+
+def get_feed_generation():
+    return int(_redis().get(GENERATION_KEY) or 0)
+
+
+def set_cached_feed(feed, generation=None):
+    redis = _redis()
+    pipe = redis.pipeline()
+    pipe.delete(CACHE_KEY)
+    pipe.hset(CACHE_KEY, FEED_FIELD, json.dumps(feed))
+    pipe.hset(CACHE_KEY, VERSION_FIELD, feed["version"])
+    pipe.expire(CACHE_KEY, CACHE_STALE_TTL)
+    if generation is None:
+        pipe.set(FRESH_KEY, 1, ex=CACHE_TTL)
+    else:
+        redis.register_script(MARK_FRESH_SCRIPT)(
+            keys=[FRESH_KEY, GENERATION_KEY],
+            args=[generation, CACHE_TTL, int(INVALIDATION_WINDOW * 1000)],
+            client=pipe,
+        )
+    pipe.publish(READY_CHANNEL, feed["version"])
+    pipe.execute()
+
+
+def feed_etag(version, limit):
+    """Quoted ETag of the body rendered for ``limit`` from feed ``version``.
+
+    A body is a pure function of the two, so no content hash is needed.
+    """
+    return f'"{version}-{limit}"'
+
+
+def _decode(version):
+    return version.decode() if version is not None else None
+
+
+def get_fresh_version(limit):
+    """Version of the fresh feed ``limit`` is served from, or None.
+
+    Cheaper than get_cached_body: the body is never fetched.
+    """
+    now = time.monotonic()
+    with _l1_lock:
+        entry = _l1.get(limit)
+    if entry is not None and now - entry[2] < L1_TTL:
+        return _decode(entry[1])
+
+    version, fresh = _get_fresh(VERSION_FIELD)
+    return _decode(version) if fresh else None
+
+
+def get_cached_body(limit):
+    """``(body, version, fresh)`` for ``limit``; body is None on a miss."""
+    now = time.monotonic()
+    with _l1_lock:
+        entry = _l1.get(limit)
+        if entry is not None:
+            _l1.move_to_end(limit)
+    if entry is not None and now - entry[2] < L1_TTL:
+        _count("hits")
+        return entry[0], _decode(entry[1]), True
+
+    field = BODY_FIELD_TEMPLATE.format(limit=limit)
+    pipe = _redis().pipeline(transaction=False)
+    pipe.hget(CACHE_KEY, VERSION_FIELD)
+    pipe.exists(FRESH_KEY)
+    if entry is None:
+        pipe.hget(CACHE_KEY, field)
+    version, fresh, *body = pipe.execute()
+
+    if entry is not None and entry[1] == version:
+        _count("revalidations")
+        body = entry[0]
+    else:
+        _count("misses")
+        body = body[0] if body else _redis().hget(CACHE_KEY, field)
+
+    if body is not None and fresh:
+        _l1_put(limit, body, version, now)
+    return body, _decode(version), bool(fresh)
+
+
+def set_cached_body(limit, version, body):
+    redis = _redis()
+    stored = redis.register_script(SET_BODY_SCRIPT)(
+        keys=[CACHE_KEY],
+        args=[VERSION_FIELD, version, BODY_FIELD_TEMPLATE.format(limit=limit), body],
+    )
+    if stored:
+        _l1_put(limit, body, version.encode(), time.monotonic())
+
+
+def _l1_put(limit, body, version, checked_at):
+    with _l1_lock:
+        _l1[limit] = (body, version, checked_at)
+        _l1.move_to_end(limit)
+        while len(_l1) > L1_MAX_SIZE:
+            _l1.popitem(last=False)
+
+
+def _count(event):
+    with _l1_lock:
+        _l1_stats[event] += 1
+
+
+def get_l1_stats():
+    with _l1_lock:
+        return dict(_l1_stats, size=len(_l1))
+
+
+def clear_l1():
+    with _l1_lock:
+        _l1.clear()
+
 
+def invalidate_feed_cache():
+    redis = _redis()
+    redis.register_script(INVALIDATE_SCRIPT)(
+        keys=[FRESH_KEY, GENERATION_KEY], args=[int(INVALIDATION_WINDOW * 1000)]
+    )
 
-def set_cached_feed(limit, posts):
-    key = CACHE_KEY_TEMPLATE.format(limit=limit)
-    cache.set(key, json.dumps(posts), CACHE_TTL)
 
+def acquire_lock():
+    return cache.add(LOCK_KEY, 1, LOCK_TIMEOUT)
 
-def invalidate_feed_cache(limits=None):
-    if limits is None:
-        limits = [10, 20, 50, 100]
 
-    for limit in limits:
-        key = CACHE_KEY_TEMPLATE.format(limit=limit)
-        cache.delete(key)
+def release_lock():
+    cache.delete(LOCK_KEY)
 
 
-def acquire_lock(limit):
-    key = LOCK_KEY_TEMPLATE.format(limit=limit)
-    return cache.add(key, 1, LOCK_TIMEOUT)
+def wait_for_cache(max_wait=LOCK_WAIT_TIMEOUT):
+    deadline = time.time() + max_wait
+    try:
+        return _wait_for_notification(deadline)
+    except RedisError:
+        return _poll_for_cache(deadline)
 
 
-def release_lock(limit):
-    key = LOCK_KEY_TEMPLATE.format(limit=limit)
-    cache.delete(key)
+def _wait_for_notification(deadline):
+    pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+    try:
+        # Subscribe before the first check so a publish in between is not lost.
+        pubsub.subscribe(READY_CHANNEL)
+        while True:
+            cached, _ = get_cached_feed()
+            remaining = deadline - time.time()
+            if cached is not None or remaining <= 0:
+                return cached
+            pubsub.get_message(timeout=remaining)
+    finally:
+        pubsub.close()
 
 
-def wait_for_cache(limit, max_wait=LOCK_WAIT_TIMEOUT):
-    start = time.time()
-    while time.time() - start < max_wait:
-        cached = get_cached_feed(limit)
+def _poll_for_cache(deadline):
+    while time.time() < deadline:
+        cached, _ = get_cached_feed()
         if cached is not None:
             return cached
         time.sleep(0.1)
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import psycopg2
+from psycopg2 import extensions
+
+# Per-process pools of PostgreSQL connections behind the feed.db_backend
+# engine. Django still opens a connection for each request and closes it at
+# the end (CONN_MAX_AGE = 0); the engine turns that into a checkout and a
+# checkin, so requests reuse warm connections instead of paying for TCP,
+# auth and a backend fork every time, and a deploy does not storm Postgres.
+#
+# A checkout waits up to TIMEOUT seconds for one of SIZE slots. Idle
+# connections are reused newest first, so spare ones age out; a connection
+# idle for more than HEALTH_CHECK_AFTER seconds runs ``SELECT 1`` first, and
+# one older than MAX_LIFETIME seconds is closed instead of reused. Checkin
+# rolls back any open transaction. No session state is relied on, so this
+# also works behind PgBouncer in transaction mode.
+DEFAULTS = {
+    "SIZE": 10,
+    "TIMEOUT": 5.0,
+    "MAX_LIFETIME": 1800.0,
+    "HEALTH_CHECK_AFTER": 1.0,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pid = os.getpid()
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+def _healthy(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if not connection.autocommit:
+            connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+class ConnectionPool:
+    def __init__(
+        self, name, connect, size, timeout, max_lifetime, health_check_after
+    ):
+        self.name = name
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # (connection, checked in at), the most recently used last.
+        self._idle = []
+        self._created = {}
+        self._closed_at = 0
+        self._stats = Counter()
+
+    def checkout(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("timeouts")
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+
+        waited = (time.monotonic() - start) * 1000
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_ms_total"] += waited
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited)
+
+        try:
+            return self._reuse() or self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def checkin(self, connection):
+        try:
+            if self._expired(connection):
+                self._drop(connection, "discarded")
+                return
+            status = connection.get_transaction_status()
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        except psycopg2.Error:
+            self._drop(connection, "discarded")
+        finally:
+            self._slots.release()
+
+    def discard(self, connection):
+        """Close a checked-out connection for good instead of checking it in."""
+        try:
+            self._drop(connection, "discarded")
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed at checkin."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._closed_at = time.monotonic()
+        for connection, _ in idle:
+            self._drop(connection, "discarded")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=self.size, idle=len(self._idle))
+            stats["in_use"] = len(self._created) - len(self._idle)
+        stats["wait_ms_total"] = round(stats.get("wait_ms_total", 0), 3)
+        stats["wait_ms_max"] = round(stats.get("wait_ms_max", 0), 3)
+        return stats
+
+    def _reuse(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, checked_in_at = self._idle.pop()
+
+            if self._expired(connection):
+                self._drop(connection, "discarded")
+            elif time.monotonic() - checked_in_at > self.health_check_after and (
+                not _healthy(connection)
+            ):
+                self._drop(connection, "failed_health_checks")
+            else:
+                return connection
+
+    def _open(self):
+        connection = self.connect()
+        with self._lock:
+            self._created[connection] = time.monotonic()
+            self._stats["opened"] += 1
+        return connection
+
+    def _expired(self, connection):
+        created_at = self._created.get(connection)
+        return (
+            connection.closed
+            or created_at is None
+            or created_at < self._closed_at
+            or time.monotonic() - created_at > self.max_lifetime
+        )
+
+    def _drop(self, connection, reason):
+        with self._lock:
+            self._created.pop(connection, None)
+            self._stats[reason] += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _count(self, event):
+        with self._lock:
+            self._stats[event] += 1
+
+
+def get_pool(alias, conn_params, options, connect):
+    """The pool for these connection parameters, created with ``connect``."""
+    global _pid
+
+    key = (alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        if os.getpid() != _pid:
+            # A forked worker must not share its parent's sockets.
+            _pools.clear()
+            _pid = os.getpid()
+
+        pool = _pools.get(key)
+        if pool is None:
+            options = dict(DEFAULTS, **options)
+            pool = _pools[key] = ConnectionPool(
+                f"{alias}/{conn_params.get('database')}",
+                connect,
+                options["SIZE"],
+                options["TIMEOUT"],
+                options["MAX_LIFETIME"],
+                options["HEALTH_CHECK_AFTER"],
+            )
+    return pool
+
+
+def get_pool_stats():
+    """Stats of every pool in this process, by ``alias/database``."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
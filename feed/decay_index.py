@@ -0,0 +1,119 @@
+import math
+import time
+
+from django_redis import get_redis_connection
+
+INDEX_KEY = "hotfeed:score:decay"
+REBUILD_KEY = "hotfeed:score:decay:rebuild"
+# Reference time (epoch seconds) that stored scores are relative to.
+EPOCH_KEY = "hotfeed:score:decay:epoch"
+REBUILD_CHUNK_SIZE = 1000
+
+# A like made at ``t`` adds ``2 ** ((t - epoch) / HALF_LIFE)`` to its post, so
+# each like is a single ZINCRBY and older likes never need to be touched: the
+# current score is the stored one times ``2 ** ((epoch - now) / HALF_LIFE)``,
+# a factor shared by every post that leaves the ranking unchanged. Stored
+# values grow as ``now`` moves away from the epoch, so renormalize() moves
+# the epoch forward (well before doubles overflow, ~1000 half-lives) and
+# drops posts whose decayed score fell below MIN_SCORE.
+HALF_LIFE = 6 * 3600
+RENORMALIZE_INTERVAL = 24 * 3600
+MIN_SCORE = 0.001
+
+INCR_SCRIPT = """
+local epoch = redis.call("get", KEYS[2])
+if not epoch then
+    return 0
+end
+local half_life = tonumber(ARGV[1])
+for i = 2, #ARGV, 3 do
+    local weight = 2 ^ ((tonumber(ARGV[i + 2]) - tonumber(epoch)) / half_life)
+    redis.call("zincrby", KEYS[1], tonumber(ARGV[i + 1]) * weight, ARGV[i])
+end
+return 1
+"""
+
+RENORMALIZE_SCRIPT = """
+local epoch = redis.call("get", KEYS[2])
+if not epoch or tonumber(ARGV[1]) - tonumber(epoch) < tonumber(ARGV[3]) then
+    return -1
+end
+local factor = 2 ^ ((tonumber(epoch) - tonumber(ARGV[1])) / tonumber(ARGV[2]))
+local entries = redis.call("zrange", KEYS[1], 0, -1, "withscores")
+for i = 1, #entries, 2 do
+    redis.call("zadd", KEYS[1], tonumber(entries[i + 1]) * factor, entries[i])
+end
+redis.call("set", KEYS[2], ARGV[1])
+return redis.call("zremrangebyscore", KEYS[1], "-inf", "(" .. ARGV[4])
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def horizon(epoch):
+    """Epoch seconds before which a like weighs less than MIN_SCORE."""
+    return epoch - HALF_LIFE * math.log2(1 / MIN_SCORE)
+
+
+def top(limit, offset=0):
+    """``(post_id, score)`` decayed to now, or None until the index is built."""
+    pipe = _redis().pipeline(transaction=False)
+    pipe.get(EPOCH_KEY)
+    pipe.zrevrange(INDEX_KEY, offset, offset + limit - 1, withscores=True)
+    epoch, entries = pipe.execute()
+
+    if epoch is None:
+        return None
+
+    factor = 2 ** ((float(epoch) - time.time()) / HALF_LIFE)
+    return [(int(member), value * factor) for member, value in entries]
+
+
+def incr(deltas, moment):
+    """Add ``delta`` likes made at ``moment`` for each post in ``deltas``."""
+    if not deltas:
+        return
+
+    args = [HALF_LIFE]
+    for post_id, delta in deltas.items():
+        args += [post_id, delta, moment.timestamp()]
+    _redis().register_script(INCR_SCRIPT)(keys=[INDEX_KEY, EPOCH_KEY], args=args)
+
+
+def remove_posts(post_ids):
+    if post_ids:
+        _redis().zrem(INDEX_KEY, *post_ids)
+
+
+def renormalize(now=None, min_interval=RENORMALIZE_INTERVAL):
+    """Rebase scores on ``now``; returns posts dropped, or None if not due."""
+    dropped = _redis().register_script(RENORMALIZE_SCRIPT)(
+        keys=[INDEX_KEY, EPOCH_KEY],
+        args=[now or time.time(), HALF_LIFE, min_interval, MIN_SCORE],
+    )
+    return None if dropped < 0 else dropped
+
+
+def replace(entries, epoch):
+    """Swap in ``(post_id, score)`` entries stored relative to ``epoch``."""
+    redis = _redis()
+    redis.delete(REBUILD_KEY)
+
+    chunk = {}
+    for post_id, score in entries:
+        chunk[post_id] = score
+        if len(chunk) >= REBUILD_CHUNK_SIZE:
+            redis.zadd(REBUILD_KEY, chunk)
+            chunk = {}
+    if chunk:
+        redis.zadd(REBUILD_KEY, chunk)
+
+    pipe = redis.pipeline()
+    if redis.exists(REBUILD_KEY):
+        pipe.rename(REBUILD_KEY, INDEX_KEY)
+    else:
+        pipe.delete(INDEX_KEY)
+    pipe.set(EPOCH_KEY, epoch)
+    pipe.execute()
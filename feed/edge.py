@@ -0,0 +1,425 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from .cache import (
+    BODY_FIELD_TEMPLATE,
+    CACHE_KEY,
+    FEED_CACHE_CONTROL,
+    FRESH_KEY,
+    VERSION_FIELD,
+    feed_etag,
+)
+from .middleware import PRIMARY_COOKIE, PRIMARY_HEADER
+
+# Standalone asyncio front for GET /v1/feed/hot: ``python -m feed.edge``.
+#
+# A fresh rendered body for the requested limit is answered straight from the
+# hash feed/cache.py writes, with one Redis round trip over a connection that
+# all clients share, carrying the same ETag as Django; a matching
+# If-None-Match gets a bodiless 304. Everything else (stale or missing body,
+# cursor, user_id, algo, an invalid limit) is forwarded to the Django app,
+# which rebuilds the feed under its stampede lock. Identical forwards in
+# flight are coalesced, except for clients pinned to the primary after a
+# write, and at most UPSTREAM_CONCURRENCY run at once, so a waiting client
+# costs a coroutine rather than a WSGI worker.
+HOT_FEED_PATH = "/v1/feed/hot"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+UPSTREAM_CONCURRENCY = 64
+MAX_HEAD_SIZE = 16384
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+
+class RedisReplyError(Exception):
+    pass
+
+
+def _encode_command(command):
+    parts = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def _read_reply(reader):
+    line = await reader.readuntil(b"\r\n")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest
+    if kind == b"-":
+        return RedisReplyError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        return None if size < 0 else (await reader.readexactly(size + 2))[:-2]
+    if kind == b"*":
+        size = int(rest)
+        return None if size < 0 else [await _read_reply(reader) for _ in range(size)]
+    raise ConnectionError(f"Unexpected Redis reply {line!r}")
+
+
+class RedisClient:
+    """Minimal Redis client multiplexing every caller over one connection.
+
+    Replies come back in request order, so each command only queues a future.
+    """
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self._writer = None
+        self._reader_task = None
+        self._pending = deque()
+        self._connecting = None
+
+    @classmethod
+    def from_url(cls, url):
+        parts = urlsplit(url)
+        return cls(
+            parts.hostname or "localhost",
+            parts.port or 6379,
+            int(parts.path.lstrip("/") or 0),
+            parts.password,
+        )
+
+    async def execute(self, *commands):
+        """Send ``commands`` back to back and return their replies."""
+        if self._writer is None:
+            await self._connect()
+        return await self._send(commands)
+
+    def _send(self, commands):
+        if self._writer is None:
+            raise ConnectionError("Redis connection lost")
+        loop = asyncio.get_event_loop()
+        futures = [loop.create_future() for _ in commands]
+        self._pending.extend(futures)
+        self._writer.write(b"".join(_encode_command(command) for command in commands))
+        return asyncio.gather(*futures)
+
+    async def _connect(self):
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._writer is not None:
+                return
+            reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self._reader_task = asyncio.ensure_future(
+                self._read_replies(reader, self._writer)
+            )
+
+            handshake = []
+            if self.password:
+                handshake.append(("AUTH", self.password))
+            if self.db:
+                handshake.append(("SELECT", self.db))
+            if handshake:
+                await self._send(handshake)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._reader_task
+
+    async def _read_replies(self, reader, writer):
+        try:
+            while True:
+                reply = await _read_reply(reader)
+                future = self._pending.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, RedisReplyError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (asyncio.IncompleteReadError, IndexError, OSError, ValueError) as e:
+            error = e
+        except asyncio.CancelledError:
+            error = ConnectionError("Redis connection closed")
+
+        if self._writer is writer:
+            self._writer = None
+        writer.close()
+        pending, self._pending = self._pending, deque()
+        for future in pending:
+            if not future.done():
+                future.set_exception(
+                    ConnectionError(f"Redis connection lost: {error!r}")
+                )
+
+
+def _parse_head(head):
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, target, version = request_line.split(" ")
+    headers = []
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers.append((name.strip().lower(), value.strip()))
+    return method, target, version, headers
+
+
+def _header(headers, name, default=""):
+    for key, value in headers:
+        if key == name:
+            return value
+    return default
+
+
+def _render(status, headers, body, keep_alive):
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    lines += [f"{name}: {value}" for name, value in headers]
+    if status != HTTPStatus.NOT_MODIFIED:
+        lines.append(f"Content-Length: {len(body)}")
+    lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _error(status, message):
+    body = ('{"error": "%s"}' % message).encode()
+    return status, [("Content-Type", "application/json")], body
+
+
+def primary_until(headers):
+    """Epoch seconds until which the client reads from the primary, as
+    middleware.primary_until sees them."""
+    value = None
+    for cookie in _header(headers, "cookie").split(";"):
+        name, _, cookie_value = cookie.strip().partition("=")
+        if name == PRIMARY_COOKIE and cookie_value:
+            value = cookie_value
+            break
+    try:
+        return float(value or _header(headers, PRIMARY_HEADER.lower()))
+    except ValueError:
+        return 0
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison against an If-None-Match list, as Django does."""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(
+        (tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags
+    )
+
+
+def cached_limit(query):
+    """The limit of a plain shared-feed request, or None if Django must answer."""
+    params = parse_qsl(query, keep_blank_values=True)
+    if len(params) > 1 or any(name != "limit" for name, _ in params):
+        return None
+
+    try:
+        limit = int(params[0][1]) if params else DEFAULT_LIMIT
+    except ValueError:
+        return None
+    return limit if 0 < limit <= MAX_LIMIT else None
+
+
+class EdgeServer:
+    def __init__(
+        self,
+        redis,
+        upstream_host,
+        upstream_port,
+        upstream_concurrency=UPSTREAM_CONCURRENCY,
+    ):
+        self.redis = redis
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.upstream_concurrency = upstream_concurrency
+        self.stats = Counter()
+        self._inflight = {}
+        self._upstream_slots = None
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD_SIZE)
+
+    async def serve_forever(self, host, port):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    method, target, version, headers = _parse_head(head[:-4])
+                    length = int(_header(headers, "content-length", "0"))
+                    body = await reader.readexactly(length) if length else b""
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    OSError,
+                ):
+                    return
+                except ValueError:
+                    writer.write(
+                        _render(*_error(400, "Bad request"), keep_alive=False)
+                    )
+                    return
+
+                status, response_headers, response_body = await self.respond(
+                    method, target, headers, body
+                )
+                connection = _header(headers, "connection").lower()
+                keep_alive = connection == "keep-alive" or (
+                    version == "HTTP/1.1" and connection != "close"
+                )
+                writer.write(
+                    _render(status, response_headers, response_body, keep_alive)
+                )
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, headers, body=b""):
+        path, _, query = target.partition("?")
+        if path != HOT_FEED_PATH:
+            return _error(404, "Not found")
+
+        if_none_match = _header(headers, "if-none-match")
+        limit = cached_limit(query)
+        if method == "GET" and limit is not None:
+            cached = await self.cached_body(limit)
+            if cached is not None:
+                body, version = cached
+                etag = feed_etag(version.decode(), limit)
+                validators = [("ETag", etag), ("Cache-Control", FEED_CACHE_CONTROL)]
+                if if_none_match and etag_matches(if_none_match, etag):
+                    self.stats["not_modified"] += 1
+                    return 304, validators, b""
+                self.stats["hits"] += 1
+                return 200, [("Content-Type", "application/json")] + validators, body
+
+        self.stats["forwards"] += 1
+        if method != "GET":
+            return await self.forward(method, target, headers, body)
+        if primary_until(headers) > time.time():
+            # Read-your-writes: an answer for someone else may be from a replica.
+            return await self.forward(method, target, headers)
+
+        # Django may answer 304 to a conditional request, so only requests
+        # with the same validator share an answer.
+        key = (target, if_none_match)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.forward(method, target, headers))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # One client going away must not cancel the answer for the others.
+        return await asyncio.shield(future)
+
+    async def cached_body(self, limit):
+        """``(body, version)`` of the fresh rendered body for ``limit``, or None."""
+        try:
+            body, version, fresh = await self.redis.execute(
+                ("HGET", CACHE_KEY, BODY_FIELD_TEMPLATE.format(limit=limit)),
+                ("HGET", CACHE_KEY, VERSION_FIELD),
+                ("EXISTS", FRESH_KEY),
+            )
+        except (OSError, RedisReplyError):
+            self.stats["redis_errors"] += 1
+            return None
+        if body is None or version is None or not fresh:
+            return None
+        return body, version
+
+    async def forward(self, method, target, headers, body=b""):
+        """Ask the Django app; it answers HTTP/1.0, so never chunked."""
+        if self._upstream_slots is None:
+            self._upstream_slots = asyncio.Semaphore(self.upstream_concurrency)
+
+        lines = [f"{method} {target} HTTP/1.0"]
+        lines += [
+            f"{name}: {value}"
+            for name, value in headers
+            if name not in HOP_BY_HOP and name != "content-length"
+        ]
+        if body:
+            lines.append(f"Content-Length: {len(body)}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        async with self._upstream_slots:
+            try:
+                reader, writer = await asyncio.open_connection(
+                    self.upstream_host, self.upstream_port
+                )
+            except OSError:
+                self.stats["upstream_errors"] += 1
+                return _error(502, "Upstream unavailable")
+            try:
+                writer.write(request)
+                response = await reader.read()
+            except OSError:
+                self.stats["upstream_errors"] += 1
+                return _error(502, "Upstream unavailable")
+            finally:
+                writer.close()
+
+        head, separator, response_body = response.partition(b"\r\n\r\n")
+        try:
+            status_line, *header_lines = head.decode("latin-1").split("\r\n")
+            status = int(status_line.split(" ")[1])
+        except (IndexError, ValueError):
+            status = None
+        if not separator or status is None:
+            self.stats["upstream_errors"] += 1
+            return _error(502, "Bad upstream response")
+
+        response_headers = []
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name.strip().lower() not in HOP_BY_HOP | {"content-length"}:
+                response_headers.append((name.strip(), value.strip()))
+        return status, response_headers, response_body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve GET /v1/feed/hot from Redis, forwarding misses to Django"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+    )
+    parser.add_argument(
+        "--upstream",
+        default=os.environ.get("EDGE_UPSTREAM", "localhost:8000"),
+        help="host:port of the Django app",
+    )
+    args = parser.parse_args(argv)
+
+    host, _, port = args.upstream.partition(":")
+    edge = EdgeServer(RedisClient.from_url(args.redis_url), host, int(port or 80))
+    asyncio.run(edge.serve_forever(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# Write-behind like_count: deltas accumulate in PENDING_KEY (post id -> delta)
+# and the flusher moves them to FLUSHING_KEY, tagged with a batch id, before
+# applying them to feed_post. A batch is applied exactly once: the UPDATE and
+# a LikeCountFlush row for its id commit together, and a leftover
+# FLUSHING_KEY is retried first on the next run.
+PENDING_KEY = "hotfeed:like_count:pending"
+FLUSHING_KEY = "hotfeed:like_count:flushing"
+BATCH_FIELD = "batch"
+
+TAKE_BATCH_SCRIPT = """
+if redis.call("exists", KEYS[2]) == 0 then
+    if redis.call("exists", KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call("rename", KEYS[1], KEYS[2])
+    redis.call("hset", KEYS[2], ARGV[1], ARGV[2])
+end
+return redis.call("hgetall", KEYS[2])
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def enabled():
+    return settings.LIKE_COUNT_WRITE_BEHIND
+
+
+def incr(post_id, delta):
+    _redis().hincrby(PENDING_KEY, post_id, delta)
+
+
+def incr_many(deltas):
+    pipe = _redis().pipeline(transaction=False)
+    for post_id, delta in deltas.items():
+        pipe.hincrby(PENDING_KEY, post_id, delta)
+    pipe.execute()
+
+
+def pending(post_ids):
+    """Deltas not yet applied to feed_post, by post id."""
+    if not post_ids:
+        return {}
+
+    fields = [str(post_id) for post_id in post_ids]
+    pipe = _redis().pipeline(transaction=False)
+    pipe.hmget(PENDING_KEY, fields)
+    pipe.hmget(FLUSHING_KEY, fields)
+    waiting, flushing = pipe.execute()
+
+    deltas = {}
+    for post_id, *values in zip(post_ids, waiting, flushing):
+        delta = sum(int(value) for value in values if value is not None)
+        if delta:
+            deltas[post_id] = delta
+    return deltas
+
+
+def take_batch():
+    """Return ``(batch_id, deltas)`` to apply, or None when nothing is pending."""
+    values = _redis().register_script(TAKE_BATCH_SCRIPT)(
+        keys=[PENDING_KEY, FLUSHING_KEY], args=[BATCH_FIELD, uuid4().hex]
+    )
+    if not values:
+        return None
+
+    fields = dict(zip(values[::2], values[1::2]))
+    batch_id = fields.pop(BATCH_FIELD.encode()).decode()
+    deltas = {int(post_id): int(delta) for post_id, delta in fields.items()}
+    return batch_id, {post_id: delta for post_id, delta in deltas.items() if delta}
+
+
+def finish_batch():
+    _redis().delete(FLUSHING_KEY)
@@ -0,0 +1,46 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse, JsonResponse
+
+from feed.services import PostService
+
+
+class Command(BaseCommand):
+    help = "Measure per-request CPU of the hot feed cache-hit path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--limits", type=int, nargs="+", default=[10, 50, 200, 1000]
+        )
+
+    def handle(self, *args, **options):
+        feed = PostService.build_hot_feed()
+
+        for limit in options["limits"]:
+            page = PostService.hot_feed_page(feed, limit)
+            # Before: the cache held a JSON string that every hit decoded and
+            # JsonResponse encoded again. After: it holds the response body.
+            cached = json.dumps(page)
+            body = cached.encode()
+
+            before = self.measure(
+                lambda: JsonResponse(json.loads(cached)), options["requests"]
+            )
+            after = self.measure(
+                lambda: HttpResponse(body, content_type="application/json"),
+                options["requests"],
+            )
+            self.stdout.write(
+                f"limit={limit} posts={len(page['posts'])} "
+                f"before_cpu_us={before:.1f} after_cpu_us={after:.1f}"
+            )
+
+    @staticmethod
+    def measure(render, requests):
+        start = time.process_time()
+        for _ in range(requests):
+            render()
+        return (time.process_time() - start) / requests * 1e6
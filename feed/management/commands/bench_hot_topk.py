@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from feed import topk
+from feed.repositories import PostRepository
+from feed.scorers import get_scorer
+from feed.services import LikeService, PostService
+from feed.validators import MAX_LIKE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Compare the Count-Min Sketch top-K with the exact SQL hot feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument(
+            "--populate",
+            type=int,
+            nargs=2,
+            metavar=("POSTS", "LIKES"),
+            help="Create POSTS posts and LIKES Zipf-distributed likes first",
+        )
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+
+        # The sketch is only fed and read while the flag is on; restore it so
+        # a command called in-process leaves the settings as it found them.
+        enabled = settings.HOT_FEED_TOPK
+        settings.HOT_FEED_TOPK = True
+        try:
+            if options["populate"]:
+                self.populate(*options["populate"])
+            else:
+                get_scorer("approx").rebuild()
+
+            exact_ids, exact_ms = self.measure(
+                lambda: [p.id for p in PostRepository.list_hot_from_db(limit)],
+                options["runs"],
+            )
+            candidate_ids, candidates_ms = self.measure(
+                lambda: topk.candidates(limit), options["runs"]
+            )
+            approx_ids, approx_ms = self.measure(
+                lambda: [p.id for p in get_scorer("approx").list_hot(limit)],
+                options["runs"],
+            )
+        finally:
+            settings.HOT_FEED_TOPK = enabled
+
+        for name, ids, elapsed in (
+            ("exact_sql", exact_ids, exact_ms),
+            ("sketch_only", candidate_ids, candidates_ms),
+            ("sketch_rescored", approx_ids, approx_ms),
+        ):
+            precision = len(set(ids) & set(exact_ids)) / max(len(exact_ids), 1)
+            self.stdout.write(
+                f"{name}: precision@{limit}={precision:.2f} ms_per_call={elapsed:.2f}"
+            )
+
+    def populate(self, posts, likes):
+        post_ids = [PostService.create_post()["id"] for _ in range(posts)]
+        weights = [1 / rank ** 1.1 for rank in range(1, posts + 1)]
+        chosen = random.choices(post_ids, weights, k=likes)
+
+        # Every like comes from a new user, so none of them is a duplicate.
+        items = [
+            {"post_id": post_id, "user_id": user_id}
+            for user_id, post_id in enumerate(chosen, start=1)
+        ]
+        for start in range(0, len(items), MAX_LIKE_BATCH_SIZE):
+            LikeService.add_likes({"likes": items[start: start + MAX_LIKE_BATCH_SIZE]})
+
+    @staticmethod
+    def measure(call, runs):
+        start = time.perf_counter()
+        for _ in range(runs):
+            result = call()
+        return result, (time.perf_counter() - start) * 1000 / runs
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from feed.services import LikeService, PostService
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent like throughput on one post per shard count"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--likes", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for shards in options["shards"]:
+            post_id = PostService.create_post()["id"]
+            PostService.set_like_count_shards(post_id, shards)
+
+            elapsed = self.run_likes(post_id, options["likes"], options["threads"])
+
+            like_count = PostService.get_post(post_id)["like_count"]
+            PostService.delete_post(post_id)
+            self.stdout.write(
+                f"shards={shards} threads={options['threads']} "
+                f"likes={like_count} likes_per_second={like_count / elapsed:.0f}"
+            )
+
+    @staticmethod
+    def run_likes(post_id, likes, threads):
+        user_ids = iter(range(1, likes + 1))
+        lock = threading.Lock()
+
+        def worker():
+            # Each like borrows a pooled connection, as a request would, so
+            # more threads than the pool size wait for a free connection.
+            while True:
+                with lock:
+                    user_id = next(user_ids, None)
+                if user_id is None:
+                    return
+                try:
+                    LikeService.add_like(user_id, post_id)
+                finally:
+                    connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - start
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feed.exceptions import ValidationError
+from feed.services import LikeService
+
+
+class Command(BaseCommand):
+    help = "Move aged likes out of feed_like into compact per-post user id sets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=2,
+            help="Compact likes older than this many days",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        try:
+            compacted, purged = LikeService.compact_likes(
+                options["older_than_days"], options["batch_size"]
+            )
+        except ValidationError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Compacted {compacted} likes, purged {purged} claims")
+        )
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from feed.services import PostService
+
+
+class Command(BaseCommand):
+    help = (
+        "Age likes older than 24h out of the Redis hot score index and "
+        "periodically renormalize decay scores"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep once the worker has caught up",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Process a single batch and exit"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        while True:
+            expired, lag = PostService.expire_hot_scores(batch_size)
+            self.stdout.write(f"expired={expired} lag_seconds={lag:.1f}")
+            dropped = PostService.renormalize_decay_scores()
+            if dropped is not None:
+                self.stdout.write(f"decay scores renormalized, dropped={dropped}")
+
+            if options["once"]:
+                return
+            if expired < batch_size:
+                time.sleep(options["interval"])
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from feed.services import PostService
+
+
+class Command(BaseCommand):
+    help = "Apply like_count deltas buffered in Redis to feed_post"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep between flushes",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Flush a single batch and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = PostService.flush_like_counts()
+            self.stdout.write(f"flushed_posts={flushed}")
+
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
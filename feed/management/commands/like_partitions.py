@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feed.exceptions import ValidationError
+from feed.services import LikeService
+
+
+class Command(BaseCommand):
+    help = "Create upcoming daily feed_like partitions and detach old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead", type=int, default=7, help="Days of partitions to create ahead"
+        )
+        parser.add_argument(
+            "--retain-days",
+            type=int,
+            default=30,
+            help="Detach partitions whose likes are all older than this",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help=(
+                "Drop detached partitions instead of keeping "
+                "feed_like_archive_* tables"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            created, detached = LikeService.maintain_partitions(
+                options["ahead"], options["retain_days"], options["drop"]
+            )
+        except ValidationError as e:
+            raise CommandError(str(e))
+
+        for name in created:
+            self.stdout.write(f"created {name}")
+        for name in detached:
+            self.stdout.write(f"{'dropped' if options['drop'] else 'archived'} {name}")
+        self.stdout.write(self.style.SUCCESS("Like partitions are up to date"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from feed.scorers import SCORERS
+from feed.services import PostService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Redis hot score indexes from feed_like"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--algo", choices=list(SCORERS), help="Rebuild only this scorer's index"
+        )
+
+    def handle(self, *args, **options):
+        PostService.rebuild_hot_index(options["algo"])
+        self.stdout.write(self.style.SUCCESS("Hot score index rebuilt"))
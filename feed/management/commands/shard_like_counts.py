@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feed.exceptions import PostNotFoundError, ValidationError
+from feed.services import PostService
+
+
+class Command(BaseCommand):
+    help = "Spread a post's like_count over N counter shards (1 = unsharded)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("post_id", type=int)
+        parser.add_argument("shards", type=int)
+
+    def handle(self, *args, **options):
+        try:
+            post = PostService.set_like_count_shards(
+                options["post_id"], options["shards"]
+            )
+        except (PostNotFoundError, ValidationError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Post {post['id']} now uses {options['shards']} shard(s), "
+                f"like_count={post['like_count']}"
+            )
+        )
@@ -0,0 +1,44 @@
+import math
+import time
+
+from django.conf import settings
+
+from . import replicas
+
+PRIMARY_COOKIE = "hotfeed_primary_until"
+PRIMARY_HEADER = "X-Primary-Until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def primary_until(request):
+    """Epoch seconds until which the client must read from the primary."""
+    value = request.COOKIES.get(PRIMARY_COOKIE) or request.META.get(
+        "HTTP_X_PRIMARY_UNTIL"
+    )
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ReplicaStickinessMiddleware:
+    """Read-your-writes: after a successful write the client reads from the
+    primary for REPLICA_STICKY_SECONDS, longer than a replica may lag.
+
+    Clients without cookies can echo the X-Primary-Until response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writing = request.method not in SAFE_METHODS
+        with replicas.pin_primary(writing or primary_until(request) > time.time()):
+            response = self.get_response(request)
+
+        if writing and response.status_code < 400:
+            sticky = settings.REPLICA_STICKY_SECONDS
+            until = f"{time.time() + sticky:.3f}"
+            response.set_cookie(PRIMARY_COOKIE, until, max_age=math.ceil(sticky))
+            response[PRIMARY_HEADER] = until
+        return response
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 16:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0002_auto_20251114_1833'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScoreBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_buckets', to='feed.Post')),
+            ],
+            options={
+                'db_table': 'feed_post_score_bucket',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postscorebucket',
+            index=models.Index(fields=['hour'], name='feed_bucket_hour_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postscorebucket',
+            unique_together=set([('post', 'hour')]),
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO feed_post_score_bucket (post_id, hour, count)
+                SELECT post_id, date_trunc('hour', created_at), count(*)
+                FROM feed_like
+                GROUP BY post_id, date_trunc('hour', created_at)
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 16:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0004_like_count_flush'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count_shards',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='PostCounterShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='feed.Post')),
+            ],
+            options={
+                'db_table': 'feed_post_counter_shard',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='postcountershard',
+            unique_together=set([('post', 'shard')]),
+        ),
+    ]
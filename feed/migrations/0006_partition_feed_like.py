@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 18:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# feed_like becomes RANGE-partitioned by day on created_at. Existing rows go
+# to one partition below today, then a partition per day for a week ahead
+# (`manage.py like_partitions` keeps extending it) and a default partition
+# as a safety net. A unique constraint on a partitioned table has to include
+# the partition key, so (user_id, post_id) uniqueness moves to
+# feed_like_dedup.
+#
+# feed_like_dedup.post_id cascades in the database; the model says
+# DO_NOTHING because an ORM cascade would delete claims by user_id alone.
+# The recreated feed_like.post_id FK is DEFERRABLE INITIALLY DEFERRED: its
+# check, and the KEY SHARE lock on feed_post that comes with it, only run at
+# COMMIT. Code that relies on a post staying put while it inserts likes must
+# lock it explicitly (see PostRepository.get_like_count_shards).
+PARTITION_SQL = """
+CREATE TABLE feed_like_dedup (
+    user_id integer NOT NULL,
+    post_id integer NOT NULL REFERENCES feed_post (id) ON DELETE CASCADE,
+    created_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (user_id, post_id)
+);
+INSERT INTO feed_like_dedup (user_id, post_id, created_at)
+SELECT user_id, post_id, created_at FROM feed_like;
+
+ALTER TABLE feed_like RENAME TO feed_like_unpartitioned;
+CREATE TABLE feed_like (
+    id integer NOT NULL DEFAULT nextval('feed_like_id_seq'::regclass),
+    post_id integer NOT NULL REFERENCES feed_post (id) DEFERRABLE INITIALLY DEFERRED,
+    user_id integer NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE feed_like_id_seq OWNED BY feed_like.id;
+
+DO $$
+DECLARE
+    today date := (now() AT TIME ZONE 'UTC')::date;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE feed_like_p_before_%s PARTITION OF feed_like '
+        'FOR VALUES FROM (MINVALUE) TO (%L)',
+        to_char(today, 'YYYYMMDD'), today::timestamp AT TIME ZONE 'UTC'
+    );
+    FOR i IN 0..7 LOOP
+        EXECUTE format(
+            'CREATE TABLE feed_like_p%s PARTITION OF feed_like '
+            'FOR VALUES FROM (%L) TO (%L)',
+            to_char(today + i, 'YYYYMMDD'),
+            (today + i)::timestamp AT TIME ZONE 'UTC',
+            (today + i + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+CREATE TABLE feed_like_default PARTITION OF feed_like DEFAULT;
+
+INSERT INTO feed_like (id, post_id, user_id, created_at)
+SELECT id, post_id, user_id, created_at FROM feed_like_unpartitioned;
+DROP TABLE feed_like_unpartitioned;
+
+CREATE INDEX feed_like_created_idx ON feed_like (created_at);
+CREATE INDEX feed_like_post_time_idx ON feed_like (post_id, created_at);
+CREATE INDEX feed_like_user_post_idx ON feed_like (user_id, post_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0005_post_counter_shard'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(PARTITION_SQL),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='like',
+                    unique_together=set([]),
+                ),
+                migrations.AddIndex(
+                    model_name='like',
+                    index=models.Index(fields=['user_id', 'post'], name='feed_like_user_post_idx'),
+                ),
+                migrations.CreateModel(
+                    name='LikeDedup',
+                    fields=[
+                        ('user_id', models.IntegerField(primary_key=True, serialize=False)),
+                        ('created_at', models.DateTimeField()),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='feed.Post')),
+                    ],
+                    options={
+                        'db_table': 'feed_like_dedup',
+                    },
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 19:20
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Raw inserts into feed_like_dedup do not name ``compacted``, so the column
+# keeps its database default. The partial indexes serve compaction: aged
+# claims still to compact, and compacted claims still to purge.
+DEDUP_COMPACTED_SQL = """
+ALTER TABLE feed_like_dedup ADD COLUMN compacted boolean NOT NULL DEFAULT false;
+CREATE INDEX feed_like_dedup_age_idx ON feed_like_dedup (created_at) WHERE NOT compacted;
+CREATE INDEX feed_like_dedup_compacted_idx ON feed_like_dedup (post_id) WHERE compacted;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0006_partition_feed_like'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(DEDUP_COMPACTED_SQL),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='likededup',
+                    name='compacted',
+                    field=models.BooleanField(default=False),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompactedLikes',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk', models.IntegerField()),
+                ('user_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compacted_likes', to='feed.Post')),
+            ],
+            options={
+                'db_table': 'feed_like_compacted',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostLikeSummary',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='like_summary', serialize=False, to='feed.Post')),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'feed_post_like_summary',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='compactedlikes',
+            unique_together=set([('post', 'chunk')]),
+        ),
+    ]
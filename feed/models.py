@@ -1,8 +1,12 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 
 
 class Post(models.Model):
     like_count = models.IntegerField(default=0)
+    # Above 1, likes go to PostCounterShard rows and like_count is only the
+    # base the shard counts are added to.
+    like_count_shards = models.IntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -19,17 +23,126 @@ class Post(models.Model):
 
 
 class Like(models.Model):
+    # feed_like is partitioned by day on created_at (see like_partitions), so
+    # the database primary key is (id, created_at) and one like per user and
+    # post is enforced by LikeDedup instead of a unique constraint.
     post = models.ForeignKey(Post, related_name="likes", on_delete=models.CASCADE)
     user_id = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "feed_like"
-        unique_together = [["user_id", "post"]]
         indexes = [
             models.Index(fields=["created_at"], name="feed_like_created_idx"),
             models.Index(fields=["post", "created_at"], name="feed_like_post_time_idx"),
+            models.Index(fields=["user_id", "post"], name="feed_like_user_post_idx"),
         ]
 
     def __str__(self):
         return f"Like by user {self.user_id} on post {self.post_id}"
+
+
+class LikeDedup(models.Model):
+    """Claims a (user, post) pair for a single like, in any partition.
+
+    The table's real primary key is (user_id, post_id); Django only knows
+    user_id, so rows must never be deleted through the ORM; post deletes
+    cascade in the database instead (hence DO_NOTHING). Rows outlive their
+    like when its partition is detached, keeping it counted.
+    ``compacted`` claims are already in CompactedLikes and are dropped on the
+    next compaction run (see compact_likes).
+    """
+
+    user_id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(Post, related_name="+", on_delete=models.DO_NOTHING)
+    created_at = models.DateTimeField()
+    compacted = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "feed_like_dedup"
+
+    def __str__(self):
+        return f"Like claim by user {self.user_id} on post {self.post_id}"
+
+
+class CompactedLikes(models.Model):
+    """Sorted user ids of a post's compacted likes, for one range of ids.
+
+    A chunk holds the users with ``user_id // COMPACTED_CHUNK_SIZE == chunk``,
+    so adding or removing one like rewrites at most 256 KB.
+    """
+
+    post = models.ForeignKey(
+        Post, related_name="compacted_likes", on_delete=models.CASCADE
+    )
+    chunk = models.IntegerField()
+    user_ids = ArrayField(models.IntegerField(), default=list)
+
+    class Meta:
+        db_table = "feed_like_compacted"
+        unique_together = [["post", "chunk"]]
+
+    def __str__(self):
+        return f"Compacted likes {self.chunk} of post {self.post_id}"
+
+
+class PostLikeSummary(models.Model):
+    """Number of a post's likes that live in CompactedLikes."""
+
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        related_name="like_summary",
+        on_delete=models.CASCADE,
+    )
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "feed_post_like_summary"
+
+    def __str__(self):
+        return f"Compacted likes of post {self.post_id}: {self.count}"
+
+
+class PostScoreBucket(models.Model):
+    post = models.ForeignKey(
+        Post, related_name="score_buckets", on_delete=models.CASCADE
+    )
+    hour = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "feed_post_score_bucket"
+        unique_together = [["post", "hour"]]
+        indexes = [
+            models.Index(fields=["hour"], name="feed_bucket_hour_idx"),
+        ]
+
+    def __str__(self):
+        return f"Bucket {self.hour:%Y-%m-%d %H}:00 of post {self.post_id}: {self.count}"
+
+
+class PostCounterShard(models.Model):
+    post = models.ForeignKey(
+        Post, related_name="counter_shards", on_delete=models.CASCADE
+    )
+    shard = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "feed_post_counter_shard"
+        unique_together = [["post", "shard"]]
+
+    def __str__(self):
+        return f"Shard {self.shard} of post {self.post_id}: {self.count}"
+
+
+class LikeCountFlush(models.Model):
+    batch_id = models.CharField(max_length=32, unique=True)
+    flushed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "feed_like_count_flush"
+
+    def __str__(self):
+        return f"Like count batch {self.batch_id}"
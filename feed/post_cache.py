@@ -0,0 +1,135 @@
+import json
+
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+
+# Serialized posts by id, for multi-get hydration. Entries are filled on read
+# (one MGET, then one query for the misses). Every write to a post (like,
+# unlike, update, delete) bumps its generation and drops the entry once it
+# has committed. A backfill is stored only if the generation it read before
+# going to the database is still current, so a read that raced a write can
+# never put back a stale like_count.
+POST_KEY_TEMPLATE = "hotfeed:post:{}"
+GENERATION_KEY_TEMPLATE = "hotfeed:post:{}:generation"
+POST_TTL = 300
+# Must outlive any backfill in flight.
+GENERATION_TTL = POST_TTL
+
+# Post aggregates are cache-aside only: score_24h slides with the hour, so
+# entries simply expire and may lag likes by up to AGGREGATES_TTL.
+AGGREGATES_KEY_TEMPLATE = "hotfeed:post:{}:aggregates"
+AGGREGATES_TTL = 5
+
+# KEYS: post key, generation key per post; ARGV: ttl, then the expected
+# generation ("" for none) and the body per post.
+SET_IF_GENERATION_SCRIPT = """
+for i = 1, #KEYS, 2 do
+    if (redis.call("get", KEYS[i + 1]) or "") == ARGV[i + 1] then
+        redis.call("set", KEYS[i], ARGV[i + 2], "EX", ARGV[1])
+    end
+end
+return 0
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _get_many(template, post_ids):
+    if not post_ids:
+        return {}
+
+    values = _redis().mget([template.format(post_id) for post_id in post_ids])
+    return {
+        post_id: json.loads(value)
+        for post_id, value in zip(post_ids, values)
+        if value is not None
+    }
+
+
+def _set_many(template, entries, ttl):
+    pipe = _redis().pipeline(transaction=False)
+    for post_id, data in entries.items():
+        pipe.set(template.format(post_id), json.dumps(data), ex=ttl)
+    pipe.execute()
+
+
+def get_many(post_ids):
+    """Cached posts by id; ids missing from the result are cache misses."""
+    return _get_many(POST_KEY_TEMPLATE, post_ids)
+
+
+def get_body(post_id):
+    """The cached post as stored JSON bytes, or None on a miss."""
+    return _redis().get(POST_KEY_TEMPLATE.format(post_id))
+
+
+def get_generations(post_ids):
+    """Current generations by id; read them before loading posts to cache."""
+    if not post_ids:
+        return {}
+
+    values = _redis().mget(
+        [GENERATION_KEY_TEMPLATE.format(post_id) for post_id in post_ids]
+    )
+    return {
+        post_id: value.decode() if value is not None else ""
+        for post_id, value in zip(post_ids, values)
+    }
+
+
+def set_many(posts, generations):
+    """Cache posts unless they were written since ``generations`` was read."""
+    if not posts:
+        return
+
+    keys, args = [], [POST_TTL]
+    for post_id, data in posts.items():
+        keys += [
+            POST_KEY_TEMPLATE.format(post_id),
+            GENERATION_KEY_TEMPLATE.format(post_id),
+        ]
+        args += [generations.get(post_id, ""), json.dumps(data)]
+    _redis().register_script(SET_IF_GENERATION_SCRIPT)(keys=keys, args=args)
+
+
+def get_aggregates(post_ids):
+    return _get_many(AGGREGATES_KEY_TEMPLATE, post_ids)
+
+
+def get_aggregates_body(post_id):
+    return _redis().get(AGGREGATES_KEY_TEMPLATE.format(post_id))
+
+
+def set_aggregates(aggregates):
+    _set_many(AGGREGATES_KEY_TEMPLATE, aggregates, AGGREGATES_TTL)
+
+
+def invalidate(post_ids):
+    """Bump the posts' generations and drop their entries.
+
+    Inside a transaction this runs again once it commits: a backfill may have
+    read the old rows and the bumped generation in between.
+    """
+    if not post_ids:
+        return
+
+    _invalidate(post_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _invalidate(post_ids))
+
+
+def _invalidate(post_ids):
+    pipe = _redis().pipeline()
+    for post_id in post_ids:
+        generation_key = GENERATION_KEY_TEMPLATE.format(post_id)
+        pipe.incr(generation_key)
+        pipe.expire(generation_key, GENERATION_TTL)
+        pipe.delete(POST_KEY_TEMPLATE.format(post_id))
+    pipe.execute()
+
+
+def delete(post_id):
+    invalidate([post_id])
+    _redis().delete(AGGREGATES_KEY_TEMPLATE.format(post_id))
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# Read-only service calls run inside read_replica() and go to one of
+# settings.DATABASE_REPLICAS (see ReplicaRouter). Every process measures a
+# replica's lag at most once per LAG_CHECK_INTERVAL seconds and leaves it out
+# of rotation while the lag is above REPLICA_MAX_LAG or the check fails.
+LAG_CHECK_INTERVAL = 5
+
+# A replica that has replayed everything it received is not behind, however
+# old its last replayed transaction is.
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery()
+        OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+_local = threading.local()
+_lags = {}
+
+
+def measure_lag(alias):
+    """Seconds the replica's data is behind the primary."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float("inf") if lag is None else float(lag)
+
+
+def get_lag(alias):
+    checked_at, lag = _lags.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at >= LAG_CHECK_INTERVAL:
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError:
+            lag = float("inf")
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def clear_lags():
+    _lags.clear()
+
+
+def healthy_replicas():
+    return [
+        alias
+        for alias in settings.DATABASE_REPLICAS
+        if get_lag(alias) <= settings.REPLICA_MAX_LAG
+    ]
+
+
+def choose_alias():
+    """A random replica fresh enough to read from, else the primary."""
+    if getattr(_local, "pinned", False):
+        return "default"
+
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else "default"
+
+
+def current_alias():
+    """The alias reads go to inside read_replica(), or None outside it."""
+    return getattr(_local, "alias", None)
+
+
+@contextmanager
+def read_replica():
+    """Route reads in this block to a replica.
+
+    Inside a transaction reads stay on the primary, so they see its writes.
+    """
+    if current_alias() is not None:
+        yield
+        return
+
+    if connections["default"].in_atomic_block:
+        _local.alias = "default"
+    else:
+        _local.alias = choose_alias()
+    try:
+        yield
+    finally:
+        _local.alias = None
+
+
+@contextmanager
+def pin_primary(pinned=True):
+    """Keep reads on the primary, e.g. right after the client wrote."""
+    previous = getattr(_local, "pinned", False)
+    _local.pinned = pinned
+    try:
+        yield
+    finally:
+        _local.pinned = previous
+
+
+def read_cursor():
+    """Cursor for raw read-only SQL on the current read alias."""
+    return connections[current_alias() or "default"].cursor()
@@ -1,9 +1,159 @@
-from datetime import timedelta
+import random
+import re
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
 
-from django.db.models import Case, Count, IntegerField, When
+from django.db import IntegrityError, connection
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.db.models.functions import Coalesce, TruncSecond
 from django.utils import timezone
 
-from .models import Like, Post
+from . import decay_index, score_index
+from .models import (
+    Like,
+    LikeCountFlush,
+    Post,
+    PostCounterShard,
+    PostScoreBucket,
+)
+from .replicas import read_cursor
+
+SCORE_WINDOW_HOURS = 24
+
+
+def bucket_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def score_window_start():
+    return bucket_hour(timezone.now()) - timedelta(hours=SCORE_WINDOW_HOURS - 1)
+
+
+def hot_key(post):
+    return post.score, post.created_at, post.id
+
+
+# Sharded posts take the like in a random counter shard instead of their row.
+# ``target`` reads the shard count under FOR KEY SHARE, so it sees the
+# committed value after a concurrent reshard, without blocking other likes.
+#
+# Sibling CTEs run in no set order, so the score bucket upsert waits for
+# ``counted_posts``: the like locks the post (or shard) row before the
+# bucket, in the same order as LikeService.remove_like.
+COUNTED_CTE = """
+    , target AS (
+        SELECT id, like_count_shards FROM feed_post
+        WHERE id IN (SELECT post_id FROM inserted)
+        FOR KEY SHARE
+    ), counted AS (
+        UPDATE feed_post SET like_count = like_count + 1
+        WHERE id IN (SELECT id FROM target WHERE like_count_shards = 1)
+        RETURNING id
+    ), sharded AS (
+        INSERT INTO feed_post_counter_shard (post_id, shard, count)
+        SELECT id, floor(random() * like_count_shards)::int, 1
+        FROM target WHERE like_count_shards > 1
+        ON CONFLICT (post_id, shard)
+        DO UPDATE SET count = feed_post_counter_shard.count + 1
+        RETURNING post_id
+    ), counted_posts AS (
+        SELECT id FROM counted UNION ALL SELECT post_id FROM sharded
+    )"""
+
+
+def window_score(window_start):
+    """Sum of a post's hourly score buckets since ``window_start``."""
+    return Coalesce(
+        Sum(
+            Case(
+                When(
+                    score_buckets__hour__gte=window_start,
+                    then=F("score_buckets__count"),
+                ),
+                output_field=IntegerField(),
+            )
+        ),
+        0,
+    )
+
+
+# Daily feed_like partitions are feed_like_pYYYYMMDD, covering that UTC day;
+# feed_like_p_before_YYYYMMDD holds everything older than that day.
+PARTITION_NAME_RE = re.compile(r"^feed_like_p(_before_)?(\d{8})$")
+ARCHIVE_PREFIX = "feed_like_archive_"
+
+# Compacted likes of a post are stored as sorted user id arrays, one per
+# range of COMPACTED_CHUNK_SIZE user ids (see CompactedLikes).
+COMPACTED_CHUNK_SIZE = 65536
+
+
+def partition_name(day):
+    return f"feed_like_p{day:%Y%m%d}"
+
+
+def partition_end(name):
+    """First day after the partition's range, or None for other partitions."""
+    match = PARTITION_NAME_RE.match(name)
+    if match is None:
+        return None
+    day = datetime.strptime(match.group(2), "%Y%m%d").date()
+    return day if match.group(1) else day + timedelta(days=1)
+
+
+# Decayed score of every post liked since ``%(since)s``, relative to
+# ``%(epoch)s`` (see decay_index). extract() returns numeric since Postgres
+# 14; the float8 cast keeps the score a float for redis.
+DECAYED_SCORES_SQL = """
+    SELECT post_id,
+           SUM(power(2, (extract(epoch FROM created_at)::float8 - %(epoch)s)
+                        / %(half_life)s)) AS score
+    FROM feed_like
+    WHERE created_at >= %(since)s
+    GROUP BY post_id
+"""
+
+
+def _decayed_scores_params(epoch):
+    return {
+        "epoch": epoch,
+        "half_life": decay_index.HALF_LIFE,
+        "since": datetime.fromtimestamp(decay_index.horizon(epoch), timezone.utc),
+    }
+
+
+def _hydrate_top(index, limit, fetch):
+    """Posts for the index entries ``fetch`` returns, with ``score`` set.
+
+    ``fetch(n, result)`` returns up to ``n`` entries following the posts
+    hydrated so far. Ids of deleted posts are dropped from ``index`` and the
+    gap refilled. Returns None when ``fetch`` does (the index is not built).
+    """
+    result = []
+    while len(result) < limit:
+        entries = fetch(limit - len(result), result)
+        if entries is None:
+            return None
+
+        posts = Post.objects.in_bulk([post_id for post_id, _ in entries])
+        stale = []
+        for post_id, score in entries:
+            post = posts.get(post_id)
+            if post is None:
+                stale.append(post_id)
+                continue
+            post.score = score
+            result.append(post)
+
+        if not stale:
+            break
+        index.remove_posts(stale)
+
+    return result
+
+
+def _top_from(index, offset):
+    return lambda n, result: index.top(n, offset + len(result))
 
 
 class PostRepository:
@@ -17,6 +167,22 @@ class PostRepository:
         except Post.DoesNotExist:
             return None
 
+    @staticmethod
+    def get_for_count_update(post_id):
+        """The post, locked FOR NO KEY UPDATE like the like-count UPDATEs.
+
+        FOR UPDATE would also wait for the KEY SHARE that likes take through
+        their FK before updating the count, and deadlock with them.
+        """
+        posts = Post.objects.raw(
+            "SELECT * FROM feed_post WHERE id = %s FOR NO KEY UPDATE", [int(post_id)]
+        )
+        return next(iter(posts), None)
+
+    @staticmethod
+    def get_by_ids(post_ids):
+        return list(Post.objects.filter(id__in=post_ids))
+
     @staticmethod
     def create(data):
         post = Post.objects.create(**data)
@@ -35,23 +201,151 @@ class PostRepository:
 
     @staticmethod
     def list_hot(limit, offset=0):
-        twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-
-        posts = (
-            Post.objects.annotate(
-                score=Count(
-                    Case(
-                        When(likes__created_at__gte=twenty_four_hours_ago, then=1),
-                        output_field=IntegerField(),
-                    )
-                )
+        result = _hydrate_top(score_index, limit, _top_from(score_index, offset))
+        if result is None:
+            return PostRepository.list_hot_from_db(limit, offset)
+        return result
+
+    @staticmethod
+    def rescore_window(post_ids, limit, offset=0):
+        """Exact window ranking restricted to ``post_ids``."""
+        if not post_ids:
+            return []
+
+        posts = Post.objects.filter(id__in=post_ids).annotate(
+            score=window_score(score_window_start())
+        )
+        posts = posts.order_by("-score", "-created_at", "-id")
+        return list(posts[offset: offset + limit])
+
+    @staticmethod
+    def list_hot_decayed(limit, offset=0):
+        result = _hydrate_top(decay_index, limit, _top_from(decay_index, offset))
+        if result is None:
+            return PostRepository.list_hot_decayed_from_db(limit, offset)
+        return result
+
+    @staticmethod
+    def list_hot_decayed_from_db(limit, offset=0):
+        params = _decayed_scores_params(timezone.now().timestamp())
+        params.update(limit=limit, offset=offset)
+        return list(
+            Post.objects.raw(
+                f"""
+                SELECT p.*, s.score FROM feed_post p
+                JOIN ({DECAYED_SCORES_SQL}) s ON s.post_id = p.id
+                ORDER BY s.score DESC, p.created_at DESC, p.id DESC
+                LIMIT %(limit)s OFFSET %(offset)s
+                """,
+                params,
             )
-            .distinct()
-            .order_by("-score", "-created_at")[offset: offset + limit]
         )
 
+    @staticmethod
+    def list_hot_after(limit, after):
+        def fetch(n, result):
+            last = hot_key(result[-1]) if result else after
+            return score_index.top_after(*last, n)
+
+        result = _hydrate_top(score_index, limit, fetch)
+        if result is None:
+            return PostRepository.list_hot_from_db(limit, after=after)
+        return result
+
+    @staticmethod
+    def list_hot_snapshot(version, position, limit):
+        def fetch(n, result):
+            nonlocal position
+            entries = score_index.snapshot_range(version, position, n)
+            if entries is not None:
+                # Stale ids stay in the snapshot, so they count too.
+                position += len(entries)
+            return entries
+
+        result = _hydrate_top(score_index, limit, fetch)
+        if result is None:
+            return None
+        return result, position
+
+    @staticmethod
+    def list_hot_from_db(limit, offset=0, after=None):
+        # Whole seconds, as in the score index, so both break ties by id and
+        # a cursor can move from one to the other.
+        posts = Post.objects.annotate(
+            score=window_score(score_window_start()),
+            created_second=TruncSecond("created_at"),
+        )
+        if after is not None:
+            score, created_at, post_id = after
+            created_second = created_at.replace(microsecond=0)
+            posts = posts.filter(
+                Q(score__lt=score)
+                | Q(score=score, created_second__lt=created_second)
+                | Q(score=score, created_second=created_second, id__lt=post_id)
+            )
+
+        posts = posts.order_by("-score", "-created_second", "-id")
+        posts = posts[offset: offset + limit]
+
         return posts
 
+    @staticmethod
+    def iter_hot_scores(since):
+        scores = dict(
+            PostScoreBucket.objects.filter(hour__gte=since)
+            .order_by()
+            .values("post_id")
+            .annotate(score=Sum("count"))
+            .values_list("post_id", "score")
+        )
+        posts = Post.objects.order_by().values_list("id", "created_at").iterator()
+        for post_id, created_at in posts:
+            yield post_id, scores.get(post_id, 0), created_at
+
+    @staticmethod
+    def iter_decayed_scores(epoch):
+        with connection.cursor() as cursor:
+            cursor.execute(DECAYED_SCORES_SQL, _decayed_scores_params(epoch))
+            yield from cursor
+
+    @staticmethod
+    def exists(post_id):
+        return Post.objects.filter(id=post_id).exists()
+
+    @staticmethod
+    def add_like_counts(deltas):
+        if not deltas:
+            return
+
+        rows = sorted(deltas.items())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE feed_post SET like_count = feed_post.like_count + v.delta
+                FROM (VALUES {}) AS v (id, delta)
+                WHERE feed_post.id = v.id
+                """.format(", ".join(["(%s, %s)"] * len(rows))),
+                [value for row in rows for value in row],
+            )
+
+    @staticmethod
+    def get_like_count_shards(post_ids):
+        """Shard counts of existing posts, key-share locked until commit.
+
+        The lock conflicts with the FOR UPDATE a reshard takes, so the counts
+        stay valid for the rest of the transaction.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, like_count_shards FROM feed_post
+                WHERE id = ANY(%s) ORDER BY id
+                FOR KEY SHARE
+                """,
+                [sorted(post_ids)],
+            )
+            return dict(cursor.fetchall())
+
     @staticmethod
     def get_like_count(post_id):
         try:
@@ -60,21 +354,352 @@ class PostRepository:
         except Post.DoesNotExist:
             return 0
 
+    @staticmethod
+    def get_with_score_24h(post_ids):
+        return list(
+            Post.objects.filter(id__in=post_ids).annotate(
+                score_24h=window_score(score_window_start())
+            )
+        )
+
     @staticmethod
     def get_score_24h(post_id):
-        twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-        return Like.objects.filter(
-            post_id=post_id, created_at__gte=twenty_four_hours_ago
-        ).count()
+        score = PostScoreBucket.objects.filter(
+            post_id=post_id, hour__gte=score_window_start()
+        ).aggregate(score=Sum("count"))["score"]
+        return score or 0
+
+
+class ScoreBucketRepository:
+    @staticmethod
+    def increment(post_id, moment, delta=1):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO feed_post_score_bucket (post_id, hour, count)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (post_id, hour)
+                DO UPDATE SET count = feed_post_score_bucket.count + EXCLUDED.count
+                """,
+                [post_id, bucket_hour(moment), delta],
+            )
+
+    @staticmethod
+    def increment_many(deltas, moment):
+        if not deltas:
+            return
+
+        rows = sorted(deltas.items())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO feed_post_score_bucket (post_id, hour, count)
+                SELECT post_id, %s, count
+                FROM unnest(%s::int[], %s::int[]) AS d (post_id, count)
+                ON CONFLICT (post_id, hour)
+                DO UPDATE SET count = feed_post_score_bucket.count + EXCLUDED.count
+                """,
+                [
+                    bucket_hour(moment),
+                    [post_id for post_id, _ in rows],
+                    [count for _, count in rows],
+                ],
+            )
+
+    @staticmethod
+    def decrement(post_id, moment, delta=1):
+        PostScoreBucket.objects.filter(
+            post_id=post_id, hour=bucket_hour(moment)
+        ).update(count=F("count") - delta)
+
+    @staticmethod
+    def iter_window_by_hour(since):
+        """``(hour, {post_id: count})`` for every bucket hour since ``since``."""
+        buckets = (
+            PostScoreBucket.objects.filter(hour__gte=since)
+            .order_by("hour")
+            .values_list("hour", "post_id", "count")
+        )
+        for hour, rows in groupby(buckets.iterator(), key=itemgetter(0)):
+            yield hour, {post_id: count for _, post_id, count in rows}
+
+    @staticmethod
+    def delete_before(hour):
+        return PostScoreBucket.objects.filter(hour__lt=hour).delete()[0]
+
+
+class CounterShardRepository:
+    @staticmethod
+    def increment(post_id, shards, delta=1):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO feed_post_counter_shard (post_id, shard, count)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (post_id, shard)
+                DO UPDATE SET count = feed_post_counter_shard.count + EXCLUDED.count
+                """,
+                [post_id, random.randrange(shards), delta],
+            )
+
+    @staticmethod
+    def decrement(post_id):
+        """Take one like off an existing shard; False when the post has none."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE feed_post_counter_shard SET count = count - 1
+                WHERE id = (
+                    SELECT id FROM feed_post_counter_shard
+                    WHERE post_id = %s ORDER BY random() LIMIT 1
+                )
+                """,
+                [post_id],
+            )
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def totals(post_ids):
+        return dict(
+            PostCounterShard.objects.filter(post_id__in=post_ids)
+            .order_by()
+            .values("post_id")
+            .annotate(total=Sum("count"))
+            .values_list("post_id", "total")
+        )
+
+    @staticmethod
+    def reshard(post, shards):
+        """Fold the shards of a locked post into like_count and reshard it."""
+        counters = PostCounterShard.objects.filter(post=post)
+        total = counters.aggregate(total=Sum("count"))["total"] or 0
+        counters.delete()
+        post.like_count = F("like_count") + total
+        post.like_count_shards = shards
+        post.save(update_fields=["like_count", "like_count_shards"])
+        post.refresh_from_db()
+        return post
+
+
+class LikeCountFlushRepository:
+    @staticmethod
+    def record(batch_id):
+        """Mark a batch as applied; False when it already was."""
+        _, created = LikeCountFlush.objects.get_or_create(batch_id=batch_id)
+        return created
+
+    @staticmethod
+    def delete_before(moment):
+        return LikeCountFlush.objects.filter(flushed_at__lt=moment).delete()[0]
 
 
 class LikeRepository:
     @staticmethod
     def get_or_none(user_id, post_id):
-        try:
-            return Like.objects.get(user_id=user_id, post_id=post_id)
-        except Like.DoesNotExist:
+        """The like, or None. A like whose partition was detached comes back
+        with ``id`` None and the claim's ``created_at``; a compacted like
+        also has no ``created_at``."""
+        with read_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT l.id, coalesce(l.created_at, d.created_at)
+                FROM feed_like_dedup d
+                LEFT JOIN feed_like l
+                    ON l.user_id = d.user_id AND l.post_id = d.post_id
+                WHERE d.user_id = %(user_id)s AND d.post_id = %(post_id)s
+                UNION ALL
+                SELECT NULL, NULL FROM feed_like_compacted c
+                WHERE c.post_id = %(post_id)s AND c.chunk = %(chunk)s
+                    AND c.user_ids @> ARRAY[%(user_id)s]
+                """,
+                {
+                    "user_id": user_id,
+                    "post_id": int(post_id),
+                    "chunk": user_id // COMPACTED_CHUNK_SIZE,
+                },
+            )
+            row = cursor.fetchone()
+
+        if row is None:
             return None
+        like_id, created_at = row
+        return Like(
+            id=like_id, post_id=int(post_id), user_id=user_id, created_at=created_at
+        )
+
+    @staticmethod
+    def claim(user_id, post_id, created_at):
+        """Reserve the (user, post) pair; IntegrityError if already liked."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO feed_like_dedup (user_id, post_id, created_at)
+                SELECT %(user_id)s, %(post_id)s, %(created_at)s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM feed_like_compacted
+                    WHERE post_id = %(post_id)s AND chunk = %(chunk)s
+                        AND user_ids @> ARRAY[%(user_id)s]
+                )
+                """,
+                {
+                    "user_id": user_id,
+                    "post_id": post_id,
+                    "created_at": created_at,
+                    "chunk": int(user_id) // COMPACTED_CHUNK_SIZE,
+                },
+            )
+            if cursor.rowcount == 0:
+                raise IntegrityError(
+                    f"User {user_id} already liked post {post_id} (compacted)"
+                )
+
+    @staticmethod
+    def release(user_id, post_id):
+        """Free the pair in the claims and in the compacted likes."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH released AS (
+                    DELETE FROM feed_like_dedup
+                    WHERE user_id = %(user_id)s AND post_id = %(post_id)s
+                ), uncompacted AS (
+                    UPDATE feed_like_compacted
+                    SET user_ids = array_remove(user_ids, %(user_id)s)
+                    WHERE post_id = %(post_id)s AND chunk = %(chunk)s
+                        AND user_ids @> ARRAY[%(user_id)s]
+                    RETURNING post_id
+                )
+                UPDATE feed_post_like_summary SET count = count - 1
+                WHERE post_id IN (SELECT post_id FROM uncompacted)
+                """,
+                {
+                    "user_id": user_id,
+                    "post_id": post_id,
+                    "chunk": user_id // COMPACTED_CHUNK_SIZE,
+                },
+            )
+
+    @staticmethod
+    def liked_post_ids(user_id, post_ids):
+        with read_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT post_id FROM feed_like_dedup
+                WHERE user_id = %(user_id)s AND post_id = ANY(%(post_ids)s)
+                UNION
+                SELECT post_id FROM feed_like_compacted
+                WHERE post_id = ANY(%(post_ids)s) AND chunk = %(chunk)s
+                    AND user_ids @> ARRAY[%(user_id)s]
+                """,
+                {
+                    "user_id": user_id,
+                    "post_ids": list(post_ids),
+                    "chunk": user_id // COMPACTED_CHUNK_SIZE,
+                },
+            )
+            return {post_id for post_id, in cursor.fetchall()}
+
+    @staticmethod
+    def insert_like(user_id, post_id, created_at, count=True):
+        """Insert a like and bump its post's counters in one statement.
+
+        With ``count=False`` feed_post.like_count is left to the caller.
+
+        Returns ``(like, created)``. ``like`` is None when the post does not
+        exist or the conflicting like is not visible to this statement yet.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH claimed AS (
+                    INSERT INTO feed_like_dedup (user_id, post_id, created_at)
+                    SELECT %(user_id)s, id, %(created_at)s
+                    FROM feed_post WHERE id = %(post_id)s AND NOT EXISTS (
+                        SELECT 1 FROM feed_like_compacted c
+                        WHERE c.post_id = %(post_id)s AND c.chunk = %(chunk)s
+                            AND c.user_ids @> ARRAY[%(user_id)s]
+                    )
+                    ON CONFLICT (user_id, post_id) DO NOTHING
+                    RETURNING user_id, post_id, created_at
+                ), inserted AS (
+                    INSERT INTO feed_like (post_id, user_id, created_at)
+                    SELECT post_id, user_id, created_at FROM claimed
+                    RETURNING id, post_id, created_at
+                ){counted}, bucketed AS (
+                    INSERT INTO feed_post_score_bucket (post_id, hour, count)
+                    SELECT post_id, %(hour)s, 1 FROM inserted{after_count}
+                    ON CONFLICT (post_id, hour)
+                    DO UPDATE SET count = feed_post_score_bucket.count + 1
+                )
+                SELECT id, created_at, true FROM inserted
+                UNION ALL
+                SELECT l.id, coalesce(l.created_at, d.created_at), false
+                FROM feed_like_dedup d
+                LEFT JOIN feed_like l
+                    ON l.user_id = d.user_id AND l.post_id = d.post_id
+                WHERE d.user_id = %(user_id)s AND d.post_id = %(post_id)s
+                UNION ALL
+                SELECT NULL, NULL, false FROM feed_like_compacted c
+                WHERE c.post_id = %(post_id)s AND c.chunk = %(chunk)s
+                    AND c.user_ids @> ARRAY[%(user_id)s]
+                """.format(
+                    counted=COUNTED_CTE if count else "",
+                    after_count=(
+                        " WHERE post_id IN (SELECT id FROM counted_posts)"
+                        if count
+                        else ""
+                    ),
+                ),
+                {
+                    "user_id": user_id,
+                    "post_id": int(post_id),
+                    "created_at": created_at,
+                    "hour": bucket_hour(created_at),
+                    "chunk": user_id // COMPACTED_CHUNK_SIZE,
+                },
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None, False
+        like_id, created_at, created = row
+        like = Like(
+            id=like_id, post_id=int(post_id), user_id=user_id, created_at=created_at
+        )
+        return like, created
+
+    @staticmethod
+    def insert_likes(pairs, created_at):
+        """Insert ``(post_id, user_id)`` pairs, skipping duplicates and
+        missing posts. Returns the set of pairs that were inserted."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH claimed AS (
+                    INSERT INTO feed_like_dedup (user_id, post_id, created_at)
+                    SELECT i.user_id, i.post_id, %s
+                    FROM unnest(%s::int[], %s::int[]) AS i (post_id, user_id)
+                    JOIN feed_post p ON p.id = i.post_id
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM feed_like_compacted c
+                        WHERE c.post_id = i.post_id AND c.chunk = i.user_id / %s
+                            AND c.user_ids @> ARRAY[i.user_id]
+                    )
+                    ON CONFLICT (user_id, post_id) DO NOTHING
+                    RETURNING user_id, post_id, created_at
+                )
+                INSERT INTO feed_like (post_id, user_id, created_at)
+                SELECT post_id, user_id, created_at FROM claimed
+                RETURNING post_id, user_id
+                """,
+                [
+                    created_at,
+                    [post_id for post_id, _ in pairs],
+                    [user_id for _, user_id in pairs],
+                    COMPACTED_CHUNK_SIZE,
+                ],
+            )
+            return set(cursor.fetchall())
 
     @staticmethod
     def create_like(user_id, post_id):
@@ -92,6 +717,140 @@ class LikeRepository:
             queryset = queryset[:limit]
         return queryset
 
+    @staticmethod
+    def list_created_after(watermark, before, limit):
+        created_at, like_id = watermark
+        return list(
+            Like.objects.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=like_id),
+                created_at__lt=before,
+            )
+            .order_by("created_at", "id")
+            .values_list("id", "post_id", "created_at")[:limit]
+        )
+
     @staticmethod
     def exists(user_id, post_id):
-        return Like.objects.filter(user_id=user_id, post_id=post_id).exists()
+        return LikeRepository.get_or_none(user_id, post_id) is not None
+
+
+class CompactedLikeRepository:
+    @staticmethod
+    def compact(cutoff, limit):
+        """Move up to ``limit`` likes claimed before ``cutoff`` into the
+        compacted store and out of feed_like. Returns how many were moved.
+
+        Their claims stay, flagged ``compacted``, until purge(): a like
+        statement that began before this commit still conflicts on them.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH batch AS (
+                    SELECT user_id, post_id FROM feed_like_dedup
+                    WHERE created_at < %(cutoff)s AND NOT compacted
+                    ORDER BY created_at
+                    LIMIT %(limit)s
+                    FOR UPDATE
+                ), marked AS (
+                    UPDATE feed_like_dedup d SET compacted = true
+                    FROM batch b
+                    WHERE d.user_id = b.user_id AND d.post_id = b.post_id
+                ), removed AS (
+                    DELETE FROM feed_like l
+                    USING batch b
+                    WHERE l.user_id = b.user_id AND l.post_id = b.post_id
+                ), merged AS (
+                    INSERT INTO feed_like_compacted (post_id, chunk, user_ids)
+                    SELECT post_id, user_id / %(chunk_size)s,
+                        array_agg(user_id ORDER BY user_id)
+                    FROM batch
+                    GROUP BY 1, 2
+                    ON CONFLICT (post_id, chunk) DO UPDATE SET user_ids = (
+                        SELECT array_agg(u ORDER BY u)
+                        FROM unnest(feed_like_compacted.user_ids || EXCLUDED.user_ids) u
+                    )
+                ), summarized AS (
+                    INSERT INTO feed_post_like_summary (post_id, count)
+                    SELECT post_id, count(*) FROM batch GROUP BY post_id
+                    ON CONFLICT (post_id)
+                    DO UPDATE SET count = feed_post_like_summary.count + EXCLUDED.count
+                )
+                SELECT count(*) FROM batch
+                """,
+                {
+                    "cutoff": cutoff,
+                    "limit": limit,
+                    "chunk_size": COMPACTED_CHUNK_SIZE,
+                },
+            )
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def purge(limit):
+        """Drop up to ``limit`` claims that an earlier run compacted."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                DELETE FROM feed_like_dedup
+                WHERE (user_id, post_id) IN (
+                    SELECT user_id, post_id FROM feed_like_dedup
+                    WHERE compacted
+                    LIMIT %s
+                )
+                """,
+                [limit],
+            )
+            return cursor.rowcount
+
+
+class LikePartitionRepository:
+    @staticmethod
+    def list_names():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'feed_like'::regclass
+                """
+            )
+            return [name for name, in cursor.fetchall()]
+
+    @staticmethod
+    def create(day):
+        """Attach the partition for ``day``, taking over any of its rows that
+        already landed in the default partition. Run inside a transaction."""
+        name = partition_name(day)
+        start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        end = start + timedelta(days=1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {name} (LIKE feed_like INCLUDING DEFAULTS)")
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM feed_like_default
+                    WHERE created_at >= %s AND created_at < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                """,
+                [start, end],
+            )
+            cursor.execute(
+                f"ALTER TABLE feed_like ATTACH PARTITION {name} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        return name
+
+    @staticmethod
+    def detach(name, drop=False):
+        """Detach a partition and drop it or keep it as an archive table."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE feed_like DETACH PARTITION {name}")
+            if drop:
+                cursor.execute(f"DROP TABLE {name}")
+            else:
+                archive = ARCHIVE_PREFIX + name[len("feed_like_p"):].lstrip("_")
+                cursor.execute(f"ALTER TABLE {name} RENAME TO {archive}")
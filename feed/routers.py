@@ -0,0 +1,19 @@
+from . import replicas
+
+
+class ReplicaRouter:
+    """Sends ORM reads made inside replicas.read_replica() to its alias;
+    everything else, and every write, goes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return replicas.current_alias()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas follow the primary's schema through streaming replication.
+        return db == "default"
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+INDEX_KEY = "hotfeed:score:hot"
+REBUILD_KEY = "hotfeed:score:hot:rebuild"
+# (created_at, like_id) of the newest like already aged out of the index.
+WATERMARK_KEY = "hotfeed:score:watermark"
+EXPIRY_LAG_KEY = "hotfeed:score:expiry_lag"
+SNAPSHOT_KEY_TEMPLATE = "hotfeed:score:snapshot:{version}"
+REBUILD_CHUNK_SIZE = 1000
+# Cursor pages are read from a frozen copy of the cached top SNAPSHOT_SIZE
+# feed. It lives as long as the cached feed may still be served (stale or
+# not), so every cursor the feed hands out stays valid.
+SNAPSHOT_SIZE = 1000
+SNAPSHOT_TTL = 300
+
+# Members are post ids zero-padded to MEMBER_WIDTH digits, scores are
+# ``likes * SCORE_SCALE + created_at`` (whole epoch seconds). Redis orders
+# equal scores by member in reverse lexicographic order, which the padding
+# makes numeric, so a single ZREVRANGE returns posts ordered by
+# (-score, -created_at second, -id), the order of list_hot_from_db. Exact
+# while a post has < 2 ** 21 likes in the window.
+SCORE_SCALE = 2 ** 32
+MEMBER_WIDTH = 10
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _member(post_id):
+    return f"{int(post_id):0{MEMBER_WIDTH}d}"
+
+
+def encode_score(score, created_at):
+    return score * SCORE_SCALE + int(created_at.timestamp())
+
+
+def decode_score(value):
+    return int(value // SCORE_SCALE)
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode_watermark(created_at, like_id):
+    return f"{(created_at - EPOCH) // MICROSECOND}:{like_id}"
+
+
+def get_watermark():
+    value = _redis().get(WATERMARK_KEY)
+    if value is None:
+        return None
+    microseconds, like_id = value.decode().split(":")
+    return EPOCH + int(microseconds) * MICROSECOND, int(like_id)
+
+
+def top(limit, offset=0):
+    pipe = _redis().pipeline(transaction=False)
+    pipe.get(WATERMARK_KEY)
+    pipe.zrevrange(INDEX_KEY, offset, offset + limit - 1, withscores=True)
+    watermark, entries = pipe.execute()
+
+    if watermark is None:
+        return None
+
+    return [(int(member), decode_score(value)) for member, value in entries]
+
+
+def top_after(score, created_at, post_id, limit):
+    """Entries ranked strictly below the (score, created_at, post_id) key.
+
+    Members sharing one encoded score are ordered by ZREVRANGE in reverse
+    lexicographic order, so ties are resolved the same way here.
+    """
+    bound = encode_score(score, created_at)
+    pipe = _redis().pipeline(transaction=False)
+    pipe.get(WATERMARK_KEY)
+    pipe.zrevrangebyscore(INDEX_KEY, bound, bound)
+    pipe.zrevrangebyscore(
+        INDEX_KEY, f"({bound}", "-inf", start=0, num=limit, withscores=True
+    )
+    watermark, ties, entries = pipe.execute()
+
+    if watermark is None:
+        return None
+
+    after = [(int(m), score) for m in ties if m.decode() < _member(post_id)]
+    return (after + [(int(m), decode_score(v)) for m, v in entries])[:limit]
+
+
+def store_snapshot(entries):
+    """Freeze ``(post_id, score)`` entries and return the snapshot version."""
+    version = uuid4().hex
+    if entries:
+        key = SNAPSHOT_KEY_TEMPLATE.format(version=version)
+        pipe = _redis().pipeline()
+        pipe.rpush(key, *(f"{post_id}:{score}" for post_id, score in entries))
+        pipe.expire(key, SNAPSHOT_TTL)
+        pipe.execute()
+    return version
+
+
+def snapshot_range(version, start, count):
+    """``count`` snapshot entries from ``start``, or None once it has expired."""
+    key = SNAPSHOT_KEY_TEMPLATE.format(version=version)
+    pipe = _redis().pipeline(transaction=False)
+    pipe.exists(key)
+    pipe.lrange(key, start, start + count - 1)
+    exists, entries = pipe.execute()
+
+    if not exists:
+        return None
+
+    return [tuple(map(int, entry.split(b":"))) for entry in entries]
+
+
+def add_post(post):
+    _redis().zadd(
+        INDEX_KEY, {_member(post.id): encode_score(0, post.created_at)}, nx=True
+    )
+
+
+def remove_posts(post_ids):
+    if post_ids:
+        _redis().zrem(INDEX_KEY, *map(_member, post_ids))
+
+
+def incr_score(post_id, delta):
+    _redis().zadd(
+        INDEX_KEY, {_member(post_id): delta * SCORE_SCALE}, xx=True, incr=True
+    )
+
+
+def incr_scores(deltas):
+    pipe = _redis().pipeline(transaction=False)
+    for post_id, delta in deltas.items():
+        pipe.zadd(
+            INDEX_KEY, {_member(post_id): delta * SCORE_SCALE}, xx=True, incr=True
+        )
+    pipe.execute()
+
+
+def expire(deltas, watermark):
+    pipe = _redis().pipeline()
+    for post_id, count in deltas.items():
+        pipe.zadd(
+            INDEX_KEY, {_member(post_id): -count * SCORE_SCALE}, xx=True, incr=True
+        )
+    pipe.set(WATERMARK_KEY, _encode_watermark(*watermark))
+    pipe.execute()
+
+
+def set_expiry_lag(seconds):
+    _redis().set(EXPIRY_LAG_KEY, seconds)
+
+
+def get_expiry_lag():
+    value = _redis().get(EXPIRY_LAG_KEY)
+    return float(value) if value is not None else None
+
+
+def replace(entries, watermark):
+    redis = _redis()
+    redis.delete(REBUILD_KEY)
+
+    chunk = {}
+    for post_id, score, created_at in entries:
+        chunk[_member(post_id)] = encode_score(score, created_at)
+        if len(chunk) >= REBUILD_CHUNK_SIZE:
+            redis.zadd(REBUILD_KEY, chunk)
+            chunk = {}
+    if chunk:
+        redis.zadd(REBUILD_KEY, chunk)
+
+    pipe = redis.pipeline()
+    if redis.exists(REBUILD_KEY):
+        pipe.rename(REBUILD_KEY, INDEX_KEY)
+    else:
+        pipe.delete(INDEX_KEY)
+    pipe.set(WATERMARK_KEY, _encode_watermark(*watermark))
+    pipe.execute()
@@ -0,0 +1,155 @@
+import time
+from abc import ABC, abstractmethod
+
+from . import decay_index, score_index, topk
+from .repositories import PostRepository, ScoreBucketRepository, score_window_start
+
+
+class Scorer(ABC):
+    """Ranks posts for the hot feed.
+
+    A scorer keeps its own index current from like events, so serving the
+    top posts never has to rescan feed_like.
+    """
+
+    name = None
+
+    @abstractmethod
+    def list_hot(self, limit, offset=0):
+        """Top posts with ``score`` set, best first."""
+
+    @abstractmethod
+    def add_likes(self, deltas, moment):
+        """Apply ``deltas`` (post id -> new likes) made at ``moment``."""
+
+    @abstractmethod
+    def remove_like(self, like):
+        pass
+
+    @abstractmethod
+    def remove_posts(self, post_ids):
+        pass
+
+    @abstractmethod
+    def rebuild(self):
+        pass
+
+
+class WindowScorer(Scorer):
+    """Number of likes in the last SCORE_WINDOW_HOURS hours."""
+
+    name = "window"
+
+    def list_hot(self, limit, offset=0):
+        return PostRepository.list_hot(limit, offset)
+
+    def add_likes(self, deltas, moment):
+        score_index.incr_scores(deltas)
+
+    def remove_like(self, like):
+        # Likes at or below the watermark were already aged out.
+        watermark = score_index.get_watermark()
+        if watermark is not None and (like.created_at, like.id) > watermark:
+            score_index.incr_score(like.post_id, -1)
+
+    def remove_posts(self, post_ids):
+        score_index.remove_posts(post_ids)
+
+    def rebuild(self):
+        window_start = score_window_start()
+        ScoreBucketRepository.delete_before(window_start)
+        score_index.replace(
+            PostRepository.iter_hot_scores(window_start), (window_start, 0)
+        )
+
+
+class DecayScorer(Scorer):
+    """Likes weighted by ``2 ** (-age / HALF_LIFE)``, with no cliff."""
+
+    name = "decay"
+
+    def list_hot(self, limit, offset=0):
+        return PostRepository.list_hot_decayed(limit, offset)
+
+    def add_likes(self, deltas, moment):
+        decay_index.incr(deltas, moment)
+
+    def remove_like(self, like):
+        decay_index.incr({like.post_id: -1}, like.created_at)
+
+    def remove_posts(self, post_ids):
+        decay_index.remove_posts(post_ids)
+
+    def rebuild(self):
+        epoch = time.time()
+        decay_index.replace(PostRepository.iter_decayed_scores(epoch), epoch)
+
+    def renormalize(self):
+        return decay_index.renormalize()
+
+
+class ApproxScorer(Scorer):
+    """Window score, re-scored exactly over Count-Min Sketch candidates.
+
+    Fed only while HOT_FEED_TOPK is on; otherwise serves the exact window.
+    """
+
+    name = "approx"
+    # Candidates fetched per requested post: the merged heaps underestimate
+    # posts that fell out of some slice's heap.
+    CANDIDATE_FACTOR = 4
+
+    def list_hot(self, limit, offset=0):
+        if not topk.enabled():
+            return PostRepository.list_hot(limit, offset)
+
+        post_ids = topk.candidates((offset + limit) * self.CANDIDATE_FACTOR)
+        return PostRepository.rescore_window(post_ids, limit, offset)
+
+    def add_likes(self, deltas, moment):
+        if topk.enabled():
+            topk.incr(deltas, moment)
+
+    def remove_like(self, like):
+        if topk.enabled():
+            topk.incr({like.post_id: -1}, like.created_at)
+
+    def remove_posts(self, post_ids):
+        # Deleted posts drop out at re-scoring and age out with their slices.
+        pass
+
+    def rebuild(self):
+        if not topk.enabled():
+            return
+
+        topk.clear()
+        for hour, deltas in ScoreBucketRepository.iter_window_by_hour(
+            score_window_start()
+        ):
+            topk.incr(deltas, hour)
+
+
+DEFAULT_SCORER = "window"
+
+SCORERS = {
+    scorer.name: scorer for scorer in (WindowScorer(), DecayScorer(), ApproxScorer())
+}
+
+
+def get_scorer(name=None):
+    return SCORERS[name or DEFAULT_SCORER]
+
+
+def add_likes(deltas, moment):
+    for scorer in SCORERS.values():
+        scorer.add_likes(deltas, moment)
+
+
+def remove_like(like):
+    for scorer in SCORERS.values():
+        scorer.remove_like(like)
+
+
+def remove_posts(post_ids):
+    for scorer in SCORERS.values():
+        scorer.remove_posts(post_ids)
@@ -1,3 +1,7 @@
+import base64
+import json
+
+
 def serialize_post(post):
     return {
         "id": post.id,
@@ -6,12 +10,55 @@ def serialize_post(post):
     }
 
 
+def serialize_posts(posts, not_found):
+    return {"posts": posts, "not_found": not_found}
+
+
+def serialize_hot_post(post):
+    data = serialize_post(post)
+    data["score"] = post.score
+    return data
+
+
+def serialize_cursor(version, position, post_data):
+    payload = {
+        "v": version,
+        "p": position,
+        "k": [post_data["score"], post_data["created_at"], post_data["id"]],
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def serialize_hot_feed(posts, version):
+    return {
+        "version": version,
+        "posts": [serialize_hot_post(post) for post in posts],
+    }
+
+
+def serialize_hot_page(posts, next_cursor):
+    return {"posts": posts, "next_cursor": next_cursor}
+
+
 def serialize_like(like):
     return {
         "id": like.id,
         "post_id": int(like.post_id),
         "user_id": int(like.user_id),
-        "created_at": like.created_at.isoformat(),
+        "created_at": like.created_at.isoformat() if like.created_at else None,
+    }
+
+
+def serialize_like_batch(results):
+    return {
+        "results": [
+            {"post_id": post_id, "user_id": user_id, "status": status}
+            for post_id, user_id, status in results
+        ],
+        "summary": {
+            status: sum(1 for result in results if result[2] == status)
+            for status in ("created", "existing", "not_found")
+        },
     }
 
 
@@ -24,6 +71,10 @@ def serialize_post_aggregates(post, score_24h):
     }
 
 
+def serialize_posts_aggregates(aggregates, not_found):
+    return {"aggregates": aggregates, "not_found": not_found}
+
+
 def serialize_post_list(posts):
     return [serialize_post(post) for post in posts]
 
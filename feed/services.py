@@ -1,16 +1,116 @@
-from django.db import IntegrityError, transaction
+import json
+from collections import Counter
+from datetime import timedelta
+from functools import wraps
 
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from . import like_counts, post_cache, score_index, scorers
 from .cache import invalidate_feed_cache
 from .exceptions import LikeNotFoundError, PostNotFoundError
 
-from .repositories import LikeRepository, PostRepository
+from .repositories import (
+    CompactedLikeRepository,
+    CounterShardRepository,
+    LikeCountFlushRepository,
+    LikePartitionRepository,
+    LikeRepository,
+    PostRepository,
+    ScoreBucketRepository,
+    hot_key,
+    partition_end,
+    partition_name,
+    score_window_start,
+)
 from .serializers import (
+    serialize_cursor,
+    serialize_hot_feed,
+    serialize_hot_page,
+    serialize_hot_post,
     serialize_like,
+    serialize_like_batch,
     serialize_like_status,
     serialize_post,
     serialize_post_aggregates,
+    serialize_posts,
+    serialize_posts_aggregates,
 )
-from .validators import validate_post_data, validate_user_id
+from .replicas import read_replica
+from .signals import like_removed
+from .validators import (
+    validate_algo,
+    validate_like_batch,
+    validate_like_compaction,
+    validate_like_count_shards,
+    validate_like_retention,
+    validate_post_data,
+    validate_post_ids,
+    validate_user_id,
+)
+
+
+DEADLOCK_RETRIES = 3
+
+
+def _retry_on_deadlock(func):
+    """Run ``func`` again when Postgres aborts it to break a deadlock.
+
+    Likes and unlikes lock the post row first, but a reshard or post delete
+    can still cross a like. Calls inside an outer transaction are not retried.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DEADLOCK_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if (
+                    getattr(e.__cause__, "pgcode", None) != "40P01"
+                    or connection.in_atomic_block
+                    or attempt == DEADLOCK_RETRIES - 1
+                ):
+                    raise
+
+    return wrapper
+
+
+def _merge_pending_likes(posts):
+    sharded = [post.id for post in posts if post.like_count_shards > 1]
+    if sharded:
+        totals = CounterShardRepository.totals(sharded)
+        for post in posts:
+            post.like_count += totals.get(post.id, 0)
+
+    if like_counts.enabled():
+        deltas = like_counts.pending([post.id for post in posts])
+        for post in posts:
+            post.like_count += deltas.get(post.id, 0)
+    return posts
+
+
+def _load_aggregates(post_ids):
+    found = post_cache.get_aggregates(post_ids)
+
+    missing = [post_id for post_id in post_ids if post_id not in found]
+    if missing:
+        posts = _merge_pending_likes(PostRepository.get_with_score_24h(missing))
+        fetched = {
+            post.id: serialize_post_aggregates(post, post.score_24h) for post in posts
+        }
+        post_cache.set_aggregates(fetched)
+        found.update(fetched)
+    return found
+
+
+def _hot_page(posts, limit, version, position):
+    result = [serialize_hot_post(post) for post in _merge_pending_likes(posts)]
+
+    next_cursor = None
+    if len(result) == limit:
+        next_cursor = serialize_cursor(version, position, result[-1])
+    return serialize_hot_page(result, next_cursor)
 
 
 class PostService:
@@ -24,13 +124,53 @@ class PostService:
         return serialize_post(post)
 
     @staticmethod
+    @read_replica()
     def get_post(post_id):
         post = PostRepository.get_by_id(post_id)
         if not post:
             raise PostNotFoundError(f"Post with id {post_id} not found")
 
+        _merge_pending_likes([post])
         return serialize_post(post)
 
+    @staticmethod
+    def get_post_body(post_id):
+        """The post as JSON bytes, straight from the post cache on a hit.
+
+        Like get_posts, a miss is backfilled from the primary.
+        """
+        post_id = int(post_id)
+        body = post_cache.get_body(post_id)
+        if body is not None:
+            return body
+
+        generations = post_cache.get_generations([post_id])
+        post = PostRepository.get_by_id(post_id)
+        if not post:
+            raise PostNotFoundError(f"Post with id {post_id} not found")
+
+        data = serialize_post(_merge_pending_likes([post])[0])
+        post_cache.set_many({post_id: data}, generations)
+        return json.dumps(data).encode()
+
+    @staticmethod
+    def get_posts(ids):
+        post_ids = validate_post_ids(ids)
+        found = post_cache.get_many(post_ids)
+
+        missing = [post_id for post_id in post_ids if post_id not in found]
+        if missing:
+            generations = post_cache.get_generations(missing)
+            posts = _merge_pending_likes(PostRepository.get_by_ids(missing))
+            fetched = {post.id: serialize_post(post) for post in posts}
+            post_cache.set_many(fetched, generations)
+            found.update(fetched)
+
+        return serialize_posts(
+            [found[post_id] for post_id in post_ids if post_id in found],
+            [post_id for post_id in post_ids if post_id not in found],
+        )
+
     @staticmethod
     def update_post(post_id, **data):
         validated_data = validate_post_data(data)
@@ -39,12 +179,12 @@ class PostService:
         if not post:
             raise PostNotFoundError(f"Post with id {post_id} not found")
 
-        if not validated_data:
-            return serialize_post(post)
-
-        post = PostRepository.update(post, validated_data)
-        invalidate_feed_cache()
+        if validated_data:
+            post = PostRepository.update(post, validated_data)
+            invalidate_feed_cache()
 
+        _merge_pending_likes([post])
+        post_cache.invalidate([post.id])
         return serialize_post(post)
 
     @staticmethod
@@ -54,57 +194,265 @@ class PostService:
             raise PostNotFoundError(f"Post with id {post_id} not found")
 
         PostRepository.delete(post)
+        post_cache.delete(post_id)
 
         invalidate_feed_cache()
 
     @staticmethod
+    @read_replica()
     def list_hot_posts(limit, offset=0):
         posts = PostRepository.list_hot(limit, offset)
 
-        result = []
-        for post in posts:
-            data = serialize_post(post)
-            data["score"] = post.score
-            result.append(data)
+        return [serialize_hot_post(post) for post in _merge_pending_likes(posts)]
+
+    @staticmethod
+    @read_replica()
+    def build_hot_feed():
+        posts = _merge_pending_likes(
+            list(PostRepository.list_hot(score_index.SNAPSHOT_SIZE))
+        )
+        version = score_index.store_snapshot([(post.id, post.score) for post in posts])
+
+        return serialize_hot_feed(posts, version)
+
+    @staticmethod
+    @read_replica()
+    def list_hot_scored_page(limit, algo):
+        """Uncached top ``limit`` posts by a non-default scorer."""
+        posts = scorers.get_scorer(algo).list_hot(limit)
+        result = [serialize_hot_post(post) for post in _merge_pending_likes(posts)]
+        return serialize_hot_page(result, None)
+
+    @staticmethod
+    def hot_feed_page(feed, limit):
+        posts = feed["posts"][:limit]
+
+        next_cursor = None
+        if len(feed["posts"]) > limit or len(posts) == score_index.SNAPSHOT_SIZE:
+            next_cursor = serialize_cursor(feed["version"], limit, posts[-1])
+        return serialize_hot_page(posts, next_cursor)
+
+    @staticmethod
+    @read_replica()
+    def list_hot_page(limit, cursor):
+        version, position, after = (
+            cursor["version"],
+            cursor["position"],
+            cursor["after"],
+        )
+
+        posts = []
+        if version is not None:
+            page = PostRepository.list_hot_snapshot(version, position, limit)
+            if page is not None:
+                posts, position = page
+                if len(posts) == limit or position < score_index.SNAPSHOT_SIZE:
+                    return _hot_page(posts, limit, version, position)
+                if posts:
+                    after = hot_key(posts[-1])
+
+        # The snapshot has expired or was exhausted: continue by keyset.
+        posts += PostRepository.list_hot_after(limit - len(posts), after)
+        return _hot_page(posts, limit, None, 0)
+
+    @staticmethod
+    def rebuild_hot_index(algo=None):
+        names = [validate_algo(algo)] if algo else list(scorers.SCORERS)
+        for name in names:
+            scorers.get_scorer(name).rebuild()
+        invalidate_feed_cache()
+
+    @staticmethod
+    def renormalize_decay_scores():
+        return scorers.get_scorer("decay").renormalize()
+
+    @staticmethod
+    def expire_hot_scores(batch_size):
+        watermark = score_index.get_watermark()
+        if watermark is None:
+            return 0, 0.0
+
+        # Whole hours, as the SQL fallback sums score buckets, so both drop
+        # a like at the same moment.
+        window_start = score_window_start()
+        likes = LikeRepository.list_created_after(watermark, window_start, batch_size)
+        if likes:
+            like_id, _, created_at = likes[-1]
+            score_index.expire(
+                Counter(post_id for _, post_id, _ in likes), (created_at, like_id)
+            )
+            invalidate_feed_cache()
+
+        if len(likes) < batch_size:
+            lag = 0.0
+            ScoreBucketRepository.delete_before(window_start)
+        else:
+            lag = (window_start - likes[-1][2]).total_seconds()
+        score_index.set_expiry_lag(lag)
 
-        return result
+        return len(likes), lag
 
     @staticmethod
+    @read_replica()
     def get_post_aggregates(post_id):
-        post = PostRepository.get_by_id(post_id)
-        if not post:
+        aggregates = _load_aggregates([int(post_id)])
+        if not aggregates:
             raise PostNotFoundError(f"Post with id {post_id} not found")
 
-        score_24h = PostRepository.get_score_24h(post_id)
+        return aggregates[int(post_id)]
+
+    @staticmethod
+    def get_post_aggregates_body(post_id):
+        """The post's aggregates as JSON bytes, cached for AGGREGATES_TTL."""
+        body = post_cache.get_aggregates_body(int(post_id))
+        if body is not None:
+            return body
+
+        return json.dumps(PostService.get_post_aggregates(post_id)).encode()
 
-        return serialize_post_aggregates(post, score_24h)
+    @staticmethod
+    @read_replica()
+    def get_posts_aggregates(ids):
+        post_ids = validate_post_ids(ids)
+        found = _load_aggregates(post_ids)
 
+        return serialize_posts_aggregates(
+            [found[post_id] for post_id in post_ids if post_id in found],
+            [post_id for post_id in post_ids if post_id not in found],
+        )
 
-class LikeService:
     @staticmethod
     @transaction.atomic
-    def add_like(user_id, post_id):
-        user_id = validate_user_id(user_id)
+    def set_like_count_shards(post_id, shards):
+        shards = validate_like_count_shards(shards)
         post = PostRepository.get_by_id(post_id, lock=True)
         if not post:
             raise PostNotFoundError(f"Post with id {post_id} not found")
 
-        existing_like = LikeRepository.get_or_none(user_id, post_id)
-        if existing_like:
-            return serialize_like(existing_like), False
+        post = CounterShardRepository.reshard(post, shards)
 
-        try:
-            like = LikeRepository.create_like(user_id, post_id)
-            return serialize_like(like), True
-        except IntegrityError:
+        _merge_pending_likes([post])
+        return serialize_post(post)
+
+    @staticmethod
+    def flush_like_counts():
+        batch = like_counts.take_batch()
+        if batch is None:
+            return 0
+
+        batch_id, deltas = batch
+        with transaction.atomic():
+            if LikeCountFlushRepository.record(batch_id):
+                PostRepository.add_like_counts(deltas)
+        like_counts.finish_batch()
+        # Until finish_batch, readers added the committed deltas twice; drop
+        # anything cached from that window.
+        post_cache.invalidate(list(deltas))
+        invalidate_feed_cache()
+        LikeCountFlushRepository.delete_before(timezone.now() - timedelta(days=1))
+
+        return len(deltas)
+
+
+class LikeService:
+    @staticmethod
+    @_retry_on_deadlock
+    def add_like(user_id, post_id):
+        user_id = validate_user_id(user_id)
+
+        write_behind = like_counts.enabled()
+        like, created = LikeRepository.insert_like(
+            user_id, post_id, timezone.now(), count=not write_behind
+        )
+        while like is None:
+            # Lost a race with a concurrent like that committed after our
+            # statement started, or the post does not exist.
             like = LikeRepository.get_or_none(user_id, post_id)
-            return serialize_like(like), False
+            if like is not None:
+                break
+            if not PostRepository.exists(post_id):
+                raise PostNotFoundError(f"Post with id {post_id} not found")
+            like, created = LikeRepository.insert_like(
+                user_id, post_id, timezone.now(), count=not write_behind
+            )
+
+        if created:
+            if write_behind:
+                like_counts.incr(like.post_id, 1)
+            scorers.add_likes({like.post_id: 1}, like.created_at)
+            post_cache.invalidate([like.post_id])
+            invalidate_feed_cache()
+
+        return serialize_like(like), created
+
+    @staticmethod
+    @_retry_on_deadlock
+    def add_likes(data):
+        """Ingest a batch of likes with one insert and per-post count updates.
+
+        Each ``(post_id, user_id)`` pair is reported as ``created``,
+        ``existing`` (already liked, or repeated earlier in the batch) or
+        ``not_found``.
+        """
+        pairs = validate_like_batch(data)
+        now = timezone.now()
+        write_behind = like_counts.enabled()
+
+        with transaction.atomic():
+            created = LikeRepository.insert_likes(pairs, now)
+            deltas = Counter(post_id for post_id, _ in created)
+            # A reshard must not fold the shards under us. The claims' FK
+            # check already key-share locks posts that got a like, but that
+            # is a side effect of the schema, so lock them explicitly.
+            shards = PostRepository.get_like_count_shards(
+                {post_id for post_id, _ in pairs}
+            )
+            if not write_behind:
+                PostRepository.add_like_counts(
+                    {
+                        post_id: delta
+                        for post_id, delta in deltas.items()
+                        if shards[post_id] == 1
+                    }
+                )
+                for post_id, delta in deltas.items():
+                    if shards[post_id] > 1:
+                        CounterShardRepository.increment(
+                            post_id, shards[post_id], delta
+                        )
+            ScoreBucketRepository.increment_many(deltas, now)
+
+        if deltas:
+            if write_behind:
+                like_counts.incr_many(deltas)
+            scorers.add_likes(deltas, now)
+            post_cache.invalidate(list(deltas))
+            invalidate_feed_cache()
+
+        results = []
+        for pair in pairs:
+            if pair[0] not in shards:
+                status = "not_found"
+            elif pair in created:
+                status = "created"
+                created.discard(pair)
+            else:
+                status = "existing"
+            results.append((pair[0], pair[1], status))
+
+        return serialize_like_batch(results)
 
     @staticmethod
+    @_retry_on_deadlock
     @transaction.atomic
     def remove_like(user_id, post_id):
         user_id = validate_user_id(user_id)
-        post = PostRepository.get_by_id(post_id, lock=True)
+        # Lock the post before any other row, as the like CTE does; the lock
+        # only serializes like_count updates on feed_post.
+        if like_counts.enabled():
+            post = PostRepository.get_by_id(post_id)
+        else:
+            post = PostRepository.get_for_count_update(post_id)
         if not post:
             raise PostNotFoundError(f"Post with id {post_id} not found")
 
@@ -114,9 +462,25 @@ class LikeService:
                 f"Like from user {user_id} on post {post_id} not found"
             )
 
-        LikeRepository.delete_like(like)
+        if like.id is None:
+            # Detached or compacted: only the claim or compacted entry is left.
+            like.post = post
+            like_removed(like)
+        else:
+            LikeRepository.delete_like(like)
 
     @staticmethod
+    @read_replica()
+    def mark_liked(posts, user_id):
+        """Set a ``liked`` flag on serialized posts with one lookup."""
+        user_id = validate_user_id(user_id)
+        liked = LikeRepository.liked_post_ids(user_id, [post["id"] for post in posts])
+        for post in posts:
+            post["liked"] = post["id"] in liked
+        return posts
+
+    @staticmethod
+    @read_replica()
     def get_like_status(user_id, post_id):
         user_id = validate_user_id(user_id)
         post = PostRepository.get_by_id(post_id)
@@ -126,3 +490,64 @@ class LikeService:
         like = LikeRepository.get_or_none(user_id, post_id)
 
         return serialize_like_status(liked=like is not None, like=like)
+
+    @staticmethod
+    def maintain_partitions(ahead_days, retain_days, drop=False):
+        """Create daily feed_like partitions up to ``ahead_days`` ahead and
+        detach those entirely older than ``retain_days``.
+
+        Likes in detached partitions stay claimed in feed_like_dedup, so they
+        are still counted and can still be removed.
+        """
+        retain_days = validate_like_retention(retain_days)
+        today = timezone.now().date()
+        existing = set(LikePartitionRepository.list_names())
+
+        created = []
+        for offset in range(ahead_days + 1):
+            day = today + timedelta(days=offset)
+            if partition_name(day) not in existing:
+                with transaction.atomic():
+                    created.append(LikePartitionRepository.create(day))
+
+        detached = []
+        cutoff = today - timedelta(days=retain_days)
+        for name in sorted(existing):
+            end = partition_end(name)
+            if end is not None and end <= cutoff:
+                with transaction.atomic():
+                    LikePartitionRepository.detach(name, drop)
+                detached.append(name)
+
+        return created, detached
+
+    @staticmethod
+    def compact_likes(older_than_days, batch_size=10000):
+        """Move likes older than ``older_than_days`` out of feed_like into
+        per-post sorted user id arrays and summary counts.
+
+        Claims compacted by the previous run are dropped first; claims
+        compacted now stay until the next run. Returns ``(compacted, purged)``.
+        """
+        older_than_days, batch_size = validate_like_compaction(
+            older_than_days, batch_size
+        )
+        cutoff = timezone.now() - timedelta(days=older_than_days)
+
+        purged = 0
+        while True:
+            with transaction.atomic():
+                count = CompactedLikeRepository.purge(batch_size)
+            purged += count
+            if count < batch_size:
+                break
+
+        compacted = 0
+        while True:
+            with transaction.atomic():
+                count = CompactedLikeRepository.compact(cutoff, batch_size)
+            compacted += count
+            if count < batch_size:
+                break
+
+        return compacted, purged
@@ -1,21 +1,78 @@
 from django.db.models import F
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
+from . import like_counts, post_cache, score_index, scorers
 from .cache import invalidate_feed_cache
-from .models import Like
+from .models import Like, Post
+from .repositories import (
+    CounterShardRepository,
+    LikeRepository,
+    ScoreBucketRepository,
+)
+
+
+@receiver(post_save, sender=Post)
+def on_post_created(sender, instance, created, **kwargs):
+    if created:
+        score_index.add_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def on_post_deleted(sender, instance, **kwargs):
+    scorers.remove_posts([instance.id])
+
+
+@receiver(pre_save, sender=Like)
+def on_like_saving(sender, instance, **kwargs):
+    # ORM inserts claim the pair first so a duplicate, live or compacted,
+    # fails before the row lands in feed_like; the raw insert paths claim it
+    # in their own CTE.
+    if instance._state.adding:
+        LikeRepository.claim(
+            instance.user_id, instance.post_id, instance.created_at or timezone.now()
+        )
 
 
 @receiver(post_save, sender=Like)
 def on_like_created(sender, instance, created, **kwargs):
     if created:
-        instance.post.like_count = F("like_count") + 1
-        instance.post.save(update_fields=["like_count"])
+        if like_counts.enabled():
+            like_counts.incr(instance.post_id, 1)
+        elif instance.post.like_count_shards > 1:
+            CounterShardRepository.increment(
+                instance.post_id, instance.post.like_count_shards
+            )
+        else:
+            instance.post.like_count = F("like_count") + 1
+            instance.post.save(update_fields=["like_count"])
+        ScoreBucketRepository.increment(instance.post_id, instance.created_at)
+        scorers.add_likes({instance.post_id: 1}, instance.created_at)
+        post_cache.invalidate([instance.post_id])
         invalidate_feed_cache()
 
 
 @receiver(post_delete, sender=Like)
 def on_like_deleted(sender, instance, **kwargs):
-    instance.post.like_count = F("like_count") - 1
-    instance.post.save(update_fields=["like_count"])
+    like_removed(instance)
+
+
+def like_removed(instance):
+    """Undo a like's counters; also used for likes that are no longer in
+    feed_like (detached or compacted)."""
+    LikeRepository.release(instance.user_id, instance.post_id)
+    if like_counts.enabled():
+        like_counts.incr(instance.post_id, -1)
+    elif not (
+        instance.post.like_count_shards > 1
+        and CounterShardRepository.decrement(instance.post_id)
+    ):
+        instance.post.like_count = F("like_count") - 1
+        instance.post.save(update_fields=["like_count"])
+    if instance.created_at is not None:
+        # Compacted likes have no time and are older than any score window.
+        ScoreBucketRepository.decrement(instance.post_id, instance.created_at)
+        scorers.remove_like(instance)
+    post_cache.invalidate([instance.post_id])
     invalidate_feed_cache()
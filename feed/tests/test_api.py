@@ -4,6 +4,7 @@ import factory
 from django.core.cache import cache
 from django.test import Client, TestCase
 
+from feed.cache import clear_l1
 from feed.models import Like, Post
 
 
@@ -25,6 +26,7 @@ class LikeFactory(factory.django.DjangoModelFactory):
 class PostAPITests(TestCase):
     def setUp(self):
         cache.clear()
+        clear_l1()
         self.client = Client()
 
     def test_post_create_api(self):
@@ -45,6 +47,34 @@ class PostAPITests(TestCase):
         data = json.loads(response.content)
         self.assertEqual(data["id"], post.id)
 
+    def test_post_multi_get_api(self):
+        first, second = PostFactory(), PostFactory()
+        url = f"/v1/feed/posts/?ids={second.id},99999,{first.id}"
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([post["id"] for post in data["posts"]], [second.id, first.id])
+        self.assertEqual(data["not_found"], [99999])
+
+        LikeFactory(user_id=1, post=first)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/v1/feed/posts/?ids={second.id},{first.id}")
+        data = json.loads(response.content)
+        self.assertEqual(data["posts"][1]["like_count"], 1)
+        with self.assertNumQueries(0):
+            self.client.get(f"/v1/feed/posts/?ids={second.id},{first.id}")
+
+        self.client.delete(f"/v1/feed/posts/{second.id}/delete/")
+        data = json.loads(self.client.get(url).content)
+        self.assertEqual(data["not_found"], [second.id, 99999])
+
+    def test_post_multi_get_requires_ids(self):
+        response = self.client.get("/v1/feed/posts/?ids=1,x")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/v1/feed/posts/")
+        self.assertEqual(response.status_code, 400)
+
     def test_post_not_found_returns_404(self):
         response = self.client.get("/v1/feed/posts/99999/")
         self.assertEqual(response.status_code, 404)
@@ -96,6 +126,7 @@ class PostAPITests(TestCase):
 class LikeAPITests(TestCase):
     def setUp(self):
         cache.clear()
+        clear_l1()
         self.client = Client()
 
     def test_like_create_api(self):
@@ -163,10 +194,50 @@ class LikeAPITests(TestCase):
         data = json.loads(response.content)
         self.assertFalse(data["liked"])
 
+    def test_like_batch_api(self):
+        post = PostFactory()
+        LikeFactory(user_id=1, post=post)
+
+        response = self.client.post(
+            "/v1/feed/likes/batch",
+            data=json.dumps(
+                {
+                    "likes": [
+                        {"post_id": post.id, "user_id": 1},
+                        {"post_id": post.id, "user_id": 2},
+                        {"post_id": post.id, "user_id": 2},
+                        {"post_id": post.id + 1000, "user_id": 3},
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(
+            [item["status"] for item in data["results"]],
+            ["existing", "created", "existing", "not_found"],
+        )
+        self.assertEqual(data["summary"], {"created": 1, "existing": 2, "not_found": 1})
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 2)
+
+    def test_like_batch_invalid_user_id_returns_400(self):
+        post = PostFactory()
+        response = self.client.post(
+            "/v1/feed/likes/batch",
+            data=json.dumps({"likes": [{"post_id": post.id, "user_id": 0}]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Like.objects.exists())
+
 
 class HotFeedAPITests(TestCase):
     def setUp(self):
         cache.clear()
+        clear_l1()
         self.client = Client()
 
     def test_hot_feed_returns_posts(self):
@@ -189,3 +260,23 @@ class HotFeedAPITests(TestCase):
         with self.assertNumQueries(0):
             response = self.client.get("/v1/feed/hot?limit=50")
             self.assertEqual(response.status_code, 200)
+
+    def test_hot_feed_liked_flags_keep_cache_shared(self):
+        post1 = PostFactory()
+        post2 = PostFactory()
+        LikeFactory(user_id=7, post=post1)
+        LikeFactory(user_id=8, post=post2)
+        self.client.get("/v1/feed/hot?limit=10")
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/feed/hot?limit=10&user_id=7")
+        data = json.loads(response.content)
+        liked = {post["id"]: post["liked"] for post in data["posts"]}
+        self.assertEqual(liked, {post1.id: True, post2.id: False})
+
+        data = json.loads(self.client.get("/v1/feed/hot?limit=10").content)
+        self.assertNotIn("liked", data["posts"][0])
+
+    def test_hot_feed_invalid_user_id_returns_400(self):
+        response = self.client.get("/v1/feed/hot?user_id=abc")
+        self.assertEqual(response.status_code, 400)
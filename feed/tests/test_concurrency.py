@@ -1,11 +1,13 @@
 import threading
+from unittest import mock
 
 import factory
 from django.db import connection
 from django.test import TransactionTestCase
 
 from feed.models import Like, Post
-from feed.services import LikeService
+from feed.repositories import PostRepository
+from feed.services import LikeService, PostService
 
 
 class PostFactory(factory.django.DjangoModelFactory):
@@ -36,6 +38,8 @@ class ConcurrencyTests(TransactionTestCase):
                 results.append((like, created))
             except Exception as e:
                 errors.append(e)
+            finally:
+                connection.close()
 
         threads = [threading.Thread(target=add_like_thread) for _ in range(5)]
         for t in threads:
@@ -43,6 +47,7 @@ class ConcurrencyTests(TransactionTestCase):
         for t in threads:
             t.join()
 
+        self.assertEqual(errors, [])
         post.refresh_from_db()
         self.assertEqual(post.like_count, 1)
         self.assertEqual(Like.objects.filter(post=post, user_id=1).count(), 1)
@@ -57,6 +62,8 @@ class ConcurrencyTests(TransactionTestCase):
                 LikeService.add_like(user_id, post.id)
             except Exception as e:
                 errors.append(e)
+            finally:
+                connection.close()
 
         threads = [
             threading.Thread(target=add_like_thread, args=(i,)) for i in range(1, 11)
@@ -66,8 +73,7 @@ class ConcurrencyTests(TransactionTestCase):
         for t in threads:
             t.join()
 
-        err_count = len(errors)
-        self.assertEqual(err_count, 0)
+        self.assertEqual(errors, [])
         post.refresh_from_db()
         self.assertEqual(post.like_count, 10)
         likes_count = Like.objects.filter(post=post).count()
@@ -88,6 +94,8 @@ class ConcurrencyTests(TransactionTestCase):
                 LikeService.add_like(user_id, post.id)
             except Exception as e:
                 errors.append(e)
+            finally:
+                connection.close()
 
         def remove_like_thread(user_id):
             try:
@@ -95,6 +103,8 @@ class ConcurrencyTests(TransactionTestCase):
                 LikeService.remove_like(user_id, post.id)
             except Exception as e:
                 errors.append(e)
+            finally:
+                connection.close()
 
         add_threads = [
             threading.Thread(target=add_like_thread, args=(i,)) for i in range(6, 11)
@@ -109,6 +119,61 @@ class ConcurrencyTests(TransactionTestCase):
         for t in all_threads:
             t.join()
 
+        self.assertEqual(errors, [])
         post.refresh_from_db()
         expected_count = initial_count - 3 + 5
         self.assertEqual(post.like_count, expected_count)
+
+    def test_reshard_during_like_batch_keeps_likes(self):
+        post = PostFactory(like_count_shards=4)
+        read_shards = threading.Event()
+        resharded = threading.Event()
+        errors = []
+        get_like_count_shards = PostRepository.get_like_count_shards
+
+        def get_shards_then_pause(post_ids):
+            shards = get_like_count_shards(post_ids)
+            read_shards.set()
+            # The reshard must wait for this batch to commit, not slip in here.
+            resharded.wait(timeout=1)
+            return shards
+
+        def add_likes_thread():
+            try:
+                connection.close()
+                LikeService.add_likes(
+                    {"likes": [{"post_id": post.id, "user_id": i} for i in range(1, 6)]}
+                )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def reshard_thread():
+            try:
+                connection.close()
+                read_shards.wait(timeout=5)
+                PostService.set_like_count_shards(post.id, 1)
+                resharded.set()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with mock.patch.object(
+            PostRepository, "get_like_count_shards", side_effect=get_shards_then_pause
+        ):
+            threads = [
+                threading.Thread(target=add_likes_thread),
+                threading.Thread(target=reshard_thread),
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(errors, [])
+        post.refresh_from_db()
+        self.assertEqual(post.like_count_shards, 1)
+        self.assertEqual(post.like_count, 5)
+        self.assertFalse(post.counter_shards.exists())
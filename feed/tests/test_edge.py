@@ -0,0 +1,207 @@
+import asyncio
+import json
+import time
+
+from django.test import SimpleTestCase
+
+from feed.cache import CACHE_KEY, FEED_CACHE_CONTROL, FRESH_KEY
+from feed.edge import EdgeServer, RedisClient, cached_limit, etag_matches
+
+
+class FakeRedis:
+    """Just enough of a Redis server (HGET, EXISTS, SELECT) over RESP."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.keys = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                count = int((await reader.readuntil(b"\r\n"))[1:-2])
+                args = []
+                for _ in range(count):
+                    size = int((await reader.readuntil(b"\r\n"))[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2].decode())
+                writer.write(self.reply(args[0].upper(), args[1:]))
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def reply(self, command, args):
+        if command == "HGET":
+            value = self.hashes.get(args[0], {}).get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == "EXISTS":
+            return b":%d\r\n" % (args[0] in self.keys or args[0] in self.hashes)
+        if command == "SELECT":
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+class FakeDjango:
+    """Upstream that answers every request after ``delay`` seconds."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requests = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        self.requests.append(head.decode().split("\r\n")[0])
+        await asyncio.sleep(self.delay)
+        body = json.dumps({"posts": [], "from": "django"}).encode()
+        writer.write(
+            b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+        )
+        await writer.drain()
+        writer.close()
+
+
+async def fetch(port, target, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = f"GET {target} HTTP/1.1\r\nHost: edge\r\n{headers}Connection: close\r\n"
+    writer.write(f"{head}\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), body
+
+
+class EdgeServerTests(SimpleTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.redis = FakeRedis()
+        self.django = FakeDjango(delay=0.05)
+        redis_port = self.run_async(self.redis.start())
+        django_port = self.run_async(self.django.start())
+        self.edge = EdgeServer(
+            RedisClient("127.0.0.1", redis_port, db=1), "127.0.0.1", django_port
+        )
+        server = self.run_async(self.edge.start("127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        for closing in (server, self.redis.server, self.django.server):
+            self.addCleanup(closing.close)
+        self.addCleanup(lambda: self.run_async(self.edge.redis.close()))
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def get(self, target):
+        return self.run_async(fetch(self.port, target))
+
+    def get_with_tag(self, target, etag):
+        return self.run_async(fetch(self.port, target, f"If-None-Match: {etag}\r\n"))
+
+    def test_fresh_body_is_served_from_redis(self):
+        self.redis.hashes[CACHE_KEY] = {"body:50": b'{"posts": [1]}', "version": b"v1"}
+        self.redis.keys.add(FRESH_KEY)
+
+        self.assertEqual(self.get("/v1/feed/hot"), (200, b'{"posts": [1]}'))
+        self.assertEqual(self.get("/v1/feed/hot?limit=50"), (200, b'{"posts": [1]}'))
+        self.assertEqual(self.django.requests, [])
+        self.assertEqual(self.edge.stats["hits"], 2)
+
+    def test_current_tag_is_answered_with_304(self):
+        self.redis.hashes[CACHE_KEY] = {"body:50": b'{"posts": [1]}', "version": b"v1"}
+        self.redis.keys.add(FRESH_KEY)
+
+        response = self.run_async(self.edge.respond("GET", "/v1/feed/hot", []))
+        self.assertIn(("ETag", '"v1-50"'), response[1])
+        self.assertIn(("Cache-Control", FEED_CACHE_CONTROL), response[1])
+        self.assertEqual(self.get_with_tag("/v1/feed/hot", '"v1-50"'), (304, b""))
+        self.assertEqual(self.get_with_tag("/v1/feed/hot", '"v0-50"')[0], 200)
+        self.assertEqual(self.edge.stats["not_modified"], 1)
+
+    def test_conditional_forwards_are_coalesced_separately(self):
+        async def burst():
+            return await asyncio.gather(
+                fetch(self.port, "/v1/feed/hot?limit=10"),
+                fetch(self.port, "/v1/feed/hot?limit=10", 'If-None-Match: "v1-10"\r\n'),
+            )
+
+        self.run_async(burst())
+        self.assertEqual(len(self.django.requests), 2)
+        self.assertEqual(self.edge.stats["coalesced"], 0)
+
+    def test_stale_and_personal_requests_go_to_django(self):
+        self.redis.hashes[CACHE_KEY] = {"body:50": b'{"posts": [1]}', "version": b"v1"}
+
+        status, body = self.get("/v1/feed/hot?limit=50")
+        self.assertEqual((status, json.loads(body)["from"]), (200, "django"))
+        self.redis.keys.add(FRESH_KEY)
+        self.get("/v1/feed/hot?limit=50&user_id=7")
+        self.get("/v1/feed/hot?limit=20")
+        self.assertEqual(
+            self.django.requests,
+            [
+                "GET /v1/feed/hot?limit=50 HTTP/1.0",
+                "GET /v1/feed/hot?limit=50&user_id=7 HTTP/1.0",
+                "GET /v1/feed/hot?limit=20 HTTP/1.0",
+            ],
+        )
+
+    def test_concurrent_misses_are_coalesced(self):
+        # Slow enough upstream that all 50 requests arrive while one is open.
+        self.django.delay = 0.5
+
+        async def burst():
+            return await asyncio.gather(
+                *(fetch(self.port, "/v1/feed/hot?limit=10") for _ in range(50))
+            )
+
+        responses = self.run_async(burst())
+        self.assertEqual({status for status, _ in responses}, {200})
+        self.assertEqual(len(self.django.requests), 1)
+        self.assertEqual(self.edge.stats["coalesced"], 49)
+
+    def test_requests_pinned_to_the_primary_are_not_coalesced(self):
+        sticky = f"Cookie: a=1; hotfeed_primary_until={time.time() + 60}\r\n"
+
+        async def burst():
+            return await asyncio.gather(
+                fetch(self.port, "/v1/feed/hot?limit=10"),
+                fetch(self.port, "/v1/feed/hot?limit=10", sticky),
+                fetch(self.port, "/v1/feed/hot?limit=10", "X-Primary-Until: 1\r\n"),
+            )
+
+        self.run_async(burst())
+        self.assertEqual(len(self.django.requests), 2)
+        self.assertEqual(self.edge.stats["coalesced"], 1)
+
+    def test_redis_outage_falls_back_to_django(self):
+        self.redis.server.close()
+        self.run_async(self.redis.server.wait_closed())
+        self.edge.redis = RedisClient("127.0.0.1", 1)
+
+        self.assertEqual(self.get("/v1/feed/hot")[0], 200)
+        self.assertEqual(self.edge.stats["redis_errors"], 1)
+        self.assertEqual(self.get("/v1/feed/nothing")[0], 404)
+
+    def test_only_plain_limits_are_cached(self):
+        self.assertEqual(cached_limit(""), 50)
+        self.assertEqual(cached_limit("limit=1000"), 1000)
+        for query in (
+            "limit=0",
+            "limit=1001",
+            "limit=x",
+            "limit=5&limit=6",
+            "cursor=a",
+        ):
+            self.assertIsNone(cached_limit(query))
+
+    def test_etags_compare_weakly(self):
+        self.assertTrue(etag_matches('"a", W/"b"', '"b"'))
+        self.assertTrue(etag_matches("*", '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
@@ -1,4 +1,7 @@
+from unittest import mock
+
 import factory
+from django.db import OperationalError
 from django.test import TestCase, TransactionTestCase
 
 from feed.exceptions import (
@@ -7,6 +10,7 @@ from feed.exceptions import (
     ValidationError,
 )
 from feed.models import Like, Post
+from feed.repositories import LikeRepository
 from feed.services import LikeService, PostService
 
 
@@ -75,6 +79,27 @@ class PostServiceTests(TestCase):
         self.assertEqual(aggregates["total_likes"], 5)
         self.assertIn("score_24h", aggregates)
 
+    def test_get_aggregates_is_one_query_then_cached(self):
+        post = PostFactory()
+        LikeFactory.create_batch(2, post=post)
+
+        with self.assertNumQueries(1):
+            aggregates = PostService.get_post_aggregates(post.id)
+        self.assertEqual(aggregates["score_24h"], 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(PostService.get_post_aggregates(post.id), aggregates)
+
+    def test_get_posts_aggregates_batch(self):
+        first, second = PostFactory(), PostFactory()
+        LikeFactory.create_batch(3, post=second)
+
+        result = PostService.get_posts_aggregates(f"{second.id},99999,{first.id}")
+        self.assertEqual(
+            [item["total_likes"] for item in result["aggregates"]], [3, 0]
+        )
+        self.assertEqual(result["not_found"], [99999])
+
     def test_list_hot_posts(self):
         post1 = PostFactory()
         post2 = PostFactory()
@@ -110,6 +135,88 @@ class LikeServiceTests(TransactionTestCase):
         post.refresh_from_db()
         self.assertEqual(post.like_count, 1)
 
+    def test_add_like_is_a_single_statement(self):
+        post = PostFactory()
+        with self.assertNumQueries(1):
+            like, created = LikeService.add_like(1, post.id)
+        self.assertTrue(created)
+
+        with self.assertNumQueries(1):
+            _, created = LikeService.add_like(1, post.id)
+        self.assertFalse(created)
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(post.score_buckets.get().count, 1)
+
+    def test_add_like_retries_deadlock_victims(self):
+        class DeadlockDetected(Exception):
+            pgcode = "40P01"
+
+        insert_like = LikeRepository.insert_like
+        calls = []
+
+        def deadlock_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError("deadlock detected") from DeadlockDetected()
+            return insert_like(*args, **kwargs)
+
+        post = PostFactory()
+        with mock.patch.object(LikeRepository, "insert_like", deadlock_once):
+            _, created = LikeService.add_like(1, post.id)
+
+        self.assertTrue(created)
+        self.assertEqual(len(calls), 2)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+
+    def test_sharded_post_counts_likes_in_shards(self):
+        post = PostFactory()
+        LikeService.add_like(1, post.id)
+        PostService.set_like_count_shards(post.id, 8)
+
+        for user_id in range(2, 12):
+            LikeService.add_like(user_id, post.id)
+        LikeService.remove_like(2, post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(PostService.get_post(post.id)["like_count"], 10)
+        self.assertEqual(PostService.get_post_aggregates(post.id)["total_likes"], 10)
+
+        resharded = PostService.set_like_count_shards(post.id, 1)
+        self.assertEqual(resharded["like_count"], 10)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 10)
+        self.assertFalse(post.counter_shards.exists())
+
+    def test_add_likes_batch_groups_count_updates(self):
+        plain, sharded = PostFactory(), PostFactory()
+        PostService.set_like_count_shards(sharded.id, 4)
+        likes = [
+            {"post_id": post.id, "user_id": user_id}
+            for post in (plain, sharded)
+            for user_id in range(1, 51)
+        ]
+
+        result = LikeService.add_likes({"likes": likes})
+        self.assertEqual(result["summary"]["created"], 100)
+        result = LikeService.add_likes({"likes": likes})
+        self.assertEqual(result["summary"]["existing"], 100)
+
+        plain.refresh_from_db()
+        self.assertEqual(plain.like_count, 50)
+        self.assertEqual(plain.score_buckets.get().count, 50)
+        self.assertEqual(PostService.get_post(sharded.id)["like_count"], 50)
+
+    def test_set_like_count_shards_validates(self):
+        post = PostFactory()
+        with self.assertRaises(ValidationError):
+            PostService.set_like_count_shards(post.id, 0)
+        with self.assertRaises(PostNotFoundError):
+            PostService.set_like_count_shards(99999, 8)
+
     def test_add_like_nonexistent_post_raises_404(self):
         with self.assertRaises(PostNotFoundError):
             LikeService.add_like(1, 99999)
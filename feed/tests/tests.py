@@ -1,11 +1,17 @@
+import io
 import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
 import factory
 from django.core.cache import cache
 from django.db import IntegrityError
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 
-from feed.models import Like, Post
+from feed.cache import clear_l1
+from feed.models import Like, Post, PostScoreBucket
 
 
 class PostFactory(factory.django.DjangoModelFactory):
@@ -24,8 +30,17 @@ class LikeFactory(factory.django.DjangoModelFactory):
 
 
 class BaseTestCase(TestCase):
+    # Coalescing knobs are zeroed so a write shows up in the very next read.
+    invalidation_window = 0
+    l1_ttl = 0
+
     def setUp(self):
         cache.clear()
+        clear_l1()
+        for name in ("INVALIDATION_WINDOW", "L1_TTL"):
+            patcher = mock.patch(f"feed.cache.{name}", getattr(self, name.lower()))
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
     def get_feed(self, limit=50):
         response = Client().get(f"/v1/feed/hot?limit={limit}")
@@ -91,13 +106,336 @@ class HotFeedStampedeTests(BaseTestCase):
     def test_stampede_guard_single_update(self):
         from feed.cache import acquire_lock, release_lock
 
-        acquired = acquire_lock(50)
+        acquired = acquire_lock()
         self.assertTrue(acquired)
-        self.assertFalse(acquire_lock(50))
+        self.assertFalse(acquire_lock())
+
+        release_lock()
+        self.assertTrue(acquire_lock())
+        release_lock()
+
+    def test_waiter_wakes_on_publish_without_polling(self):
+        from feed.cache import set_cached_feed, wait_for_cache
+
+        feed = {"version": "v1", "posts": []}
+        result = []
+        with mock.patch("feed.cache._poll_for_cache", side_effect=AssertionError):
+            waiter = threading.Thread(target=lambda: result.append(wait_for_cache(5)))
+            waiter.start()
+            time.sleep(0.3)
+            set_cached_feed(feed)
+            waiter.join(timeout=2)
+
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(result, [feed])
+
+    def test_wait_falls_back_to_polling(self):
+        from redis.exceptions import ConnectionError
+
+        from feed.cache import set_cached_feed, wait_for_cache
+
+        feed = {"version": "v1", "posts": []}
+        set_cached_feed(feed)
+        with mock.patch(
+            "feed.cache._wait_for_notification", side_effect=ConnectionError
+        ):
+            self.assertEqual(wait_for_cache(1), feed)
+
+
+class HotFeedCanonicalCacheTests(BaseTestCase):
+    def test_one_recompute_serves_every_limit(self):
+        PostFactory.create_batch(3)
+        all_ids = [p["id"] for p in self.get_feed(10)]
+
+        with self.assertNumQueries(0):
+            self.assertEqual([p["id"] for p in self.get_feed(2)], all_ids[:2])
+            self.assertEqual([p["id"] for p in self.get_feed(37)], all_ids)
+
+    def test_invalidation_covers_any_limit(self):
+        from feed.services import LikeService
+
+        post = PostFactory()
+        PostFactory()
+        self.assertEqual(self.get_feed(37)[0]["score"], 0)
+
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        feed = self.get_feed(37)
+        self.assertEqual((feed[0]["id"], feed[0]["score"]), (post.id, 1))
+
+    def test_hit_returns_stored_body(self):
+        from feed.cache import get_cached_body
+
+        PostFactory()
+        first = Client().get("/v1/feed/hot?limit=5")
+
+        with self.assertNumQueries(0):
+            second = Client().get("/v1/feed/hot?limit=5")
+
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(get_cached_body(5)[0], first.content)
+
+    def test_body_is_not_attached_to_another_feed(self):
+        from feed.cache import get_cached_body, set_cached_body
+
+        PostFactory()
+        self.get_feed(5)
+        set_cached_body(7, "stale-version", b"{}")
+
+        self.assertIsNone(get_cached_body(7)[0])
+
+
+class HotFeedL1CacheTests(BaseTestCase):
+    l1_ttl = 1.0
+
+    def l1_stat(self, name):
+        from feed.cache import get_l1_stats
+
+        return get_l1_stats().get(name, 0)
+
+    def test_hit_is_served_without_redis(self):
+        PostFactory()
+        first = self.get_feed(5)
+        hits = self.l1_stat("hits")
+
+        with mock.patch("feed.cache._redis", side_effect=AssertionError):
+            self.assertEqual(self.get_feed(5), first)
+        self.assertEqual(self.l1_stat("hits"), hits + 1)
+
+    def test_entry_is_revalidated_after_ttl(self):
+        PostFactory()
+        first = self.get_feed(5)
+        revalidations = self.l1_stat("revalidations")
+
+        with mock.patch("feed.cache.L1_TTL", 0):
+            self.assertEqual(self.get_feed(5), first)
+        self.assertEqual(self.l1_stat("revalidations"), revalidations + 1)
+
+    def test_feed_written_by_another_process_is_seen_after_ttl(self):
+        from feed.cache import set_cached_feed
+
+        PostFactory()
+        self.get_feed(5)
+        set_cached_feed({"version": "other-worker", "posts": []})
+
+        self.assertEqual(len(self.get_feed(5)), 1)
+        with mock.patch("feed.cache.L1_TTL", 0):
+            self.assertEqual(self.get_feed(5), [])
+
+    def test_stats_endpoint(self):
+        PostFactory()
+        self.get_feed(5)
+        hits = self.l1_stat("hits")
+        self.get_feed(5)
 
-        release_lock(50)
-        self.assertTrue(acquire_lock(50))
-        release_lock(50)
+        stats = json.loads(Client().get("/v1/feed/hot/stats").content)["l1"]
+        self.assertEqual((stats["hits"], stats["size"]), (hits + 1, 1))
+
+
+class CoalescedInvalidationTests(BaseTestCase):
+    invalidation_window = 0.3
+
+    def fresh_ttl(self):
+        from django_redis import get_redis_connection
+
+        from feed.cache import FRESH_KEY
+
+        return get_redis_connection("default").pttl(FRESH_KEY)
+
+    def test_likes_within_window_rebuild_once(self):
+        from feed.services import LikeService
+
+        post = PostFactory()
+        self.get_feed()
+        for user_id in range(1, 51):
+            LikeService.add_like(user_id=user_id, post_id=post.id)
+
+        self.assertLessEqual(self.fresh_ttl(), 300)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_feed()[0]["score"], 0)
+
+        time.sleep(0.4)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_feed()[0]["score"], 50)
+        with self.assertNumQueries(0):
+            self.get_feed()
+
+    def test_write_during_rebuild_keeps_feed_fresh_for_one_window(self):
+        from feed.cache import (
+            get_feed_generation,
+            invalidate_feed_cache,
+            set_cached_feed,
+        )
+
+        generation = get_feed_generation()
+        invalidate_feed_cache()
+        set_cached_feed({"version": "v1", "posts": []}, generation)
+        self.assertLessEqual(self.fresh_ttl(), 300)
+
+        set_cached_feed({"version": "v2", "posts": []}, get_feed_generation())
+        self.assertGreater(self.fresh_ttl(), 300)
+
+
+class HotFeedStaleWhileRevalidateTests(BaseTestCase):
+    def test_stale_feed_served_while_another_caller_refreshes(self):
+        from feed.cache import acquire_lock, release_lock
+        from feed.services import LikeService
+
+        post = PostFactory()
+        self.get_feed()
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        self.assertTrue(acquire_lock())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_feed()[0]["score"], 0)
+            self.assertEqual(self.get_feed(7)[0]["score"], 0)
+        release_lock()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_feed()[0]["score"], 1)
+
+    def test_stale_feed_rendered_for_a_new_limit_is_not_cached_publicly(self):
+        from feed.cache import acquire_lock, release_lock
+        from feed.services import LikeService
+
+        post = PostFactory()
+        self.get_feed()
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        self.assertTrue(acquire_lock())
+        response = Client().get("/v1/feed/hot?limit=7")
+        release_lock()
+
+        self.assertEqual(json.loads(response.content)["posts"][0]["score"], 0)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_hard_expiry_recomputes(self):
+        from django_redis import get_redis_connection
+
+        from feed.cache import CACHE_KEY
+
+        PostFactory()
+        self.get_feed()
+        get_redis_connection("default").delete(CACHE_KEY)
+        clear_l1()
+
+        with self.assertNumQueries(1):
+            self.get_feed()
+
+
+class PostCacheTests(BaseTestCase):
+    def test_backfill_that_raced_a_like_is_dropped(self):
+        from feed import post_cache
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        generations = post_cache.get_generations([post.id])
+        stale = {"id": post.id, "like_count": 0}
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        post_cache.set_many({post.id: stale}, generations)
+        self.assertIsNone(post_cache.get_body(post.id))
+        posts = PostService.get_posts(str(post.id))["posts"]
+        self.assertEqual(posts[0]["like_count"], 1)
+
+        post_cache.set_many({post.id: stale}, post_cache.get_generations([post.id]))
+        self.assertEqual(json.loads(post_cache.get_body(post.id)), stale)
+
+    def test_unlike_drops_the_entry(self):
+        from feed import post_cache
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+        PostService.get_post_body(post.id)
+        LikeService.remove_like(user_id=1, post_id=post.id)
+
+        self.assertIsNone(post_cache.get_body(post.id))
+        body = PostService.get_post_body(post.id)
+        self.assertEqual(json.loads(body)["like_count"], 0)
+
+
+class ConditionalGetTests(BaseTestCase):
+    def test_current_feed_tag_is_304_without_postgres(self):
+        from feed.cache import CACHE_TTL
+
+        PostFactory()
+        first = Client().get("/v1/feed/hot?limit=5")
+        self.assertEqual(first["Cache-Control"], f"public, max-age={CACHE_TTL}")
+
+        with self.assertNumQueries(0):
+            second = Client().get(
+                "/v1/feed/hot?limit=5", HTTP_IF_NONE_MATCH=first["ETag"]
+            )
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertNotEqual(Client().get("/v1/feed/hot?limit=6")["ETag"], first["ETag"])
+
+    def test_rebuilt_feed_has_a_new_tag(self):
+        from feed.services import LikeService
+
+        post = PostFactory()
+        etag = Client().get("/v1/feed/hot?limit=5")["ETag"]
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        response = Client().get("/v1/feed/hot?limit=5", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(json.loads(response.content)["posts"][0]["score"], 1)
+
+    def test_stale_feed_is_revalidated_against_the_served_version(self):
+        from feed.cache import acquire_lock, release_lock
+        from feed.services import LikeService
+
+        post = PostFactory()
+        etag = Client().get("/v1/feed/hot?limit=5")["ETag"]
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        self.assertTrue(acquire_lock())
+        with self.assertNumQueries(0):
+            response = Client().get("/v1/feed/hot?limit=5", HTTP_IF_NONE_MATCH=etag)
+        release_lock()
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_personal_feed_has_no_tag(self):
+        PostFactory()
+        response = Client().get("/v1/feed/hot?limit=5&user_id=7")
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_post_tag_follows_likes(self):
+        from feed.services import LikeService
+
+        post = PostFactory()
+        url = f"/v1/feed/posts/{post.id}/"
+        first = Client().get(url)
+        self.assertEqual(first["Cache-Control"], "no-cache")
+
+        with self.assertNumQueries(0):
+            second = Client().get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+
+        LikeService.add_like(user_id=1, post_id=post.id)
+        third = Client().get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(json.loads(third.content)["like_count"], 1)
+
+    def test_current_aggregates_tag_is_304_without_postgres(self):
+        from feed.post_cache import AGGREGATES_TTL
+
+        post = PostFactory()
+        url = f"/v1/feed/posts/{post.id}/aggregates/"
+        first = Client().get(url)
+        self.assertEqual(first["Cache-Control"], f"max-age={AGGREGATES_TTL}")
+
+        with self.assertNumQueries(0):
+            second = Client().get(url, HTTP_IF_NONE_MATCH=f'"other", {first["ETag"]}')
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(Client().get("/v1/feed/posts/99999/").status_code, 404)
 
 
 class LikeSignalTests(BaseTestCase):
@@ -120,3 +458,764 @@ class LikeSignalTests(BaseTestCase):
 
         with self.assertRaises(IntegrityError):
             LikeFactory(post=post, user_id=1)
+
+
+class LikePartitionTests(BaseTestCase):
+    def test_partitions_are_created_ahead(self):
+        from django.utils import timezone
+
+        from feed.repositories import LikePartitionRepository, partition_name
+        from feed.services import LikeService
+
+        today = timezone.now().date()
+        upcoming = [partition_name(today + timedelta(days=day)) for day in range(10)]
+        existing = set(LikePartitionRepository.list_names())
+
+        created, _ = LikeService.maintain_partitions(9, 30)
+        self.assertEqual(created, [name for name in upcoming if name not in existing])
+        self.assertLessEqual(set(upcoming), set(LikePartitionRepository.list_names()))
+        self.assertEqual(LikeService.maintain_partitions(9, 30), ([], []))
+
+    def test_detached_likes_stay_counted_and_removable(self):
+        from django.utils import timezone
+
+        from feed.repositories import LikePartitionRepository, partition_name
+        from feed.services import LikeService
+
+        today = timezone.now().date()
+        history = [
+            name
+            for name in LikePartitionRepository.list_names()
+            if name.startswith("feed_like_p_before_")
+        ]
+        for name in history:
+            LikePartitionRepository.detach(name, drop=True)
+        old_day = today - timedelta(days=5)
+        if partition_name(old_day) not in LikePartitionRepository.list_names():
+            LikePartitionRepository.create(old_day)
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+        Like.objects.filter(user_id=1).update(
+            created_at=timezone.now() - timedelta(days=5)
+        )
+
+        _, detached = LikeService.maintain_partitions(7, 2)
+        self.assertIn(partition_name(old_day), detached)
+        self.assertFalse(Like.objects.exists())
+
+        status = LikeService.get_like_status(user_id=1, post_id=post.id)
+        self.assertTrue(status["liked"])
+        self.assertIsNone(status["like"]["id"])
+        _, created = LikeService.add_like(user_id=1, post_id=post.id)
+        self.assertFalse(created)
+
+        LikeService.remove_like(user_id=1, post_id=post.id)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 0)
+        self.assertFalse(LikeService.get_like_status(1, post.id)["liked"])
+
+    def test_retention_keeps_the_hot_window(self):
+        from feed.exceptions import ValidationError
+        from feed.services import LikeService
+
+        with self.assertRaises(ValidationError):
+            LikeService.maintain_partitions(7, 1)
+
+
+class LikeCompactionTests(BaseTestCase):
+    def age_likes(self, days):
+        from django.utils import timezone
+
+        from feed.models import LikeDedup
+
+        moment = timezone.now() - timedelta(days=days)
+        Like.objects.update(created_at=moment)
+        LikeDedup.objects.update(created_at=moment)
+
+    def test_compacted_likes_stay_counted_and_deduplicated(self):
+        from feed.models import CompactedLikes, LikeDedup, PostLikeSummary
+        from feed.services import LikeService
+
+        post = PostFactory()
+        for user_id in (70000, 5, 3):
+            LikeService.add_like(user_id=user_id, post_id=post.id)
+        self.age_likes(3)
+        LikeService.add_like(user_id=9, post_id=post.id)
+
+        self.assertEqual(LikeService.compact_likes(2), (3, 0))
+        self.assertEqual(list(Like.objects.values_list("user_id", flat=True)), [9])
+        self.assertEqual(
+            list(
+                CompactedLikes.objects.filter(post=post)
+                .order_by("chunk")
+                .values_list("chunk", "user_ids")
+            ),
+            [(0, [3, 5]), (1, [70000])],
+        )
+        self.assertEqual(PostLikeSummary.objects.get(post=post).count, 3)
+
+        self.assertEqual(LikeService.compact_likes(2), (0, 3))
+        self.assertEqual(list(LikeDedup.objects.values_list("user_id", flat=True)), [9])
+
+        status = LikeService.get_like_status(user_id=5, post_id=post.id)
+        self.assertTrue(status["liked"])
+        self.assertIsNone(status["like"]["created_at"])
+        _, created = LikeService.add_like(user_id=5, post_id=post.id)
+        self.assertFalse(created)
+        result = LikeService.add_likes({"likes": [{"post_id": post.id, "user_id": 3}]})
+        self.assertEqual(result["summary"]["existing"], 1)
+        self.assertEqual(
+            LikeService.mark_liked([{"id": post.id}], 70000),
+            [{"id": post.id, "liked": True}],
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 4)
+
+    def test_removing_a_compacted_like(self):
+        from feed.models import CompactedLikes, PostLikeSummary
+        from feed.services import LikeService
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+        LikeService.add_like(user_id=2, post_id=post.id)
+        self.age_likes(3)
+        LikeService.compact_likes(2)
+        LikeService.compact_likes(2)
+
+        LikeService.remove_like(user_id=1, post_id=post.id)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(CompactedLikes.objects.get(post=post).user_ids, [2])
+        self.assertEqual(PostLikeSummary.objects.get(post=post).count, 1)
+        self.assertFalse(LikeService.get_like_status(1, post.id)["liked"])
+
+        _, created = LikeService.add_like(user_id=1, post_id=post.id)
+        self.assertTrue(created)
+
+    def test_orm_cannot_relike_a_compacted_pair(self):
+        from feed.services import LikeService
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+        self.age_likes(3)
+        LikeService.compact_likes(2)
+        LikeService.compact_likes(2)
+
+        with self.assertRaises(IntegrityError):
+            LikeFactory(post=post, user_id=1)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertFalse(Like.objects.exists())
+
+    def test_compaction_keeps_the_hot_window(self):
+        from feed.exceptions import ValidationError
+        from feed.services import LikeService
+
+        with self.assertRaises(ValidationError):
+            LikeService.compact_likes(1)
+
+
+class ScoreBucketTests(BaseTestCase):
+    def test_like_create_and_delete_update_bucket(self):
+        from feed.services import LikeService
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+        LikeService.add_like(user_id=2, post_id=post.id)
+        self.assertEqual(PostScoreBucket.objects.get(post=post).count, 2)
+
+        LikeService.remove_like(user_id=1, post_id=post.id)
+        self.assertEqual(PostScoreBucket.objects.get(post=post).count, 1)
+
+    def test_buckets_outside_window_are_ignored(self):
+        from feed.repositories import PostRepository, score_window_start
+
+        old_post = PostFactory()
+        new_post = PostFactory()
+        PostScoreBucket.objects.create(
+            post=old_post, hour=score_window_start() - timedelta(hours=1), count=10
+        )
+        LikeFactory(post=new_post)
+
+        self.assertEqual(PostRepository.get_score_24h(old_post.id), 0)
+        self.assertEqual(PostRepository.get_score_24h(new_post.id), 1)
+        self.assertEqual(
+            [p["id"] for p in self.get_feed()], [new_post.id, old_post.id]
+        )
+
+
+class HotScoreIndexTests(BaseTestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def test_feed_served_from_index(self):
+        from feed.services import LikeService, PostService
+
+        post1 = PostFactory()
+        post2 = PostFactory()
+        LikeFactory.create_batch(2, post=post1)
+        PostService.rebuild_hot_index()
+
+        LikeService.add_like(user_id=100, post_id=post2.id)
+        LikeService.add_like(user_id=101, post_id=post2.id)
+        LikeService.add_like(user_id=102, post_id=post2.id)
+        post3 = PostFactory()
+
+        with self.assertNumQueries(1):
+            posts = self.get_feed()
+
+        self.assertEqual([p["id"] for p in posts], [post2.id, post1.id, post3.id])
+        self.assertEqual([p["score"] for p in posts], [3, 2, 0])
+
+    def test_like_delete_decrements_index(self):
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        LikeFactory(post=post, user_id=1)
+        LikeFactory(post=post, user_id=2)
+        PostService.rebuild_hot_index()
+
+        LikeService.remove_like(user_id=1, post_id=post.id)
+
+        self.assertEqual(self.get_feed()[0]["score"], 1)
+
+    def test_stale_members_are_skipped(self):
+        from feed import score_index
+        from feed.services import PostService
+
+        post = PostFactory()
+        PostService.rebuild_hot_index()
+        stale = PostFactory.build(id=post.id + 1000, created_at=post.created_at)
+        score_index.add_post(stale)
+        score_index.incr_score(stale.id, 5)
+
+        self.assertEqual([p["id"] for p in self.get_feed()], [post.id])
+        self.assertEqual(score_index.top(10), [(post.id, 0)])
+
+    def test_ties_break_by_id_as_in_the_sql_fallback(self):
+        from feed import score_index
+        from feed.repositories import PostRepository
+        from feed.services import PostService
+
+        first, second = PostFactory(), PostFactory()
+        moment = first.created_at.replace(microsecond=0)
+        # The older id is the later post, within one second.
+        Post.objects.filter(id=first.id).update(
+            created_at=moment + timedelta(microseconds=900000)
+        )
+        Post.objects.filter(id=second.id).update(
+            created_at=moment + timedelta(microseconds=100000)
+        )
+        PostService.rebuild_hot_index()
+
+        expected = [second.id, first.id]
+        self.assertEqual([p.id for p in PostRepository.list_hot(10)], expected)
+        self.assertEqual(
+            [p.id for p in PostRepository.list_hot_from_db(10)], expected
+        )
+        after = (0, moment + timedelta(microseconds=500000), second.id)
+        self.assertEqual(
+            [p.id for p in PostRepository.list_hot_after(10, after)], [first.id]
+        )
+        self.assertEqual(
+            [p.id for p in PostRepository.list_hot_from_db(10, after=after)],
+            [first.id],
+        )
+
+        score_index.replace([(9, 0, moment), (10, 0, moment)], (moment, 0))
+        self.assertEqual(score_index.top(10), [(10, 0), (9, 0)])
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+
+        post = PostFactory()
+        LikeFactory.create_batch(2, post=post)
+        call_command("rebuild_score_index", stdout=io.StringIO())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_feed()[0]["score"], 2)
+
+
+class ScoreExpiryTests(BaseTestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def test_expiry_decrements_in_batches_and_is_idempotent(self):
+        from django.utils import timezone
+
+        from feed import score_index
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        PostService.rebuild_hot_index()
+        for user_id in range(1, 4):
+            LikeService.add_like(user_id=user_id, post_id=post.id)
+
+        now = timezone.now()
+        Like.objects.filter(user_id__in=[1, 2]).update(
+            created_at=now - timedelta(hours=25)
+        )
+        score_index.expire({}, (now - timedelta(hours=48), 0))
+
+        expired, lag = PostService.expire_hot_scores(batch_size=1)
+        self.assertEqual(expired, 1)
+        self.assertGreater(lag, 0)
+        self.assertEqual(self.get_feed()[0]["score"], 2)
+
+        self.assertEqual(PostService.expire_hot_scores(batch_size=10), (1, 0.0))
+        self.assertEqual(PostService.expire_hot_scores(batch_size=10), (0, 0.0))
+        self.assertEqual(score_index.get_expiry_lag(), 0.0)
+        self.assertEqual(self.get_feed()[0]["score"], 1)
+
+        LikeService.remove_like(user_id=1, post_id=post.id)
+        self.assertEqual(self.get_feed()[0]["score"], 1)
+
+    def test_expiry_uses_the_bucket_window(self):
+        from feed import score_index
+        from feed.repositories import PostRepository, bucket_hour, score_window_start
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        PostService.rebuild_hot_index()
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        # Less than 24 hours old, but in the hour just before the window.
+        moment = score_window_start() - timedelta(microseconds=1)
+        Like.objects.update(created_at=moment)
+        PostScoreBucket.objects.update(hour=bucket_hour(moment))
+        score_index.expire({}, (moment - timedelta(hours=1), 0))
+
+        self.assertEqual(PostService.expire_hot_scores(batch_size=10), (1, 0.0))
+        self.assertEqual(self.get_feed()[0]["score"], 0)
+        self.assertEqual(PostRepository.list_hot_from_db(10)[0].score, 0)
+
+    def test_expire_command_reports_lag(self):
+        from django.core.management import call_command
+
+        from feed.services import PostService
+
+        PostService.rebuild_hot_index()
+        out = io.StringIO()
+        call_command("expire_scores", "--once", stdout=out)
+
+        self.assertIn("lag_seconds=0.0", out.getvalue())
+
+
+class DecayScorerTests(BaseTestCase):
+    def get_decay_feed(self):
+        response = Client().get("/v1/feed/hot?limit=10&algo=decay")
+        return json.loads(response.content)["posts"]
+
+    def make_posts(self):
+        from django.utils import timezone
+
+        fresh, older = PostFactory(), PostFactory()
+        LikeFactory.create_batch(3, post=fresh)
+        LikeFactory.create_batch(4, post=older)
+        Like.objects.filter(post=older).update(
+            created_at=timezone.now() - timedelta(hours=20)
+        )
+        return fresh, older
+
+    def test_decay_ranks_recent_likes_higher(self):
+        from feed.services import PostService
+
+        fresh, older = self.make_posts()
+        PostService.rebuild_hot_index()
+
+        self.assertEqual([p["id"] for p in self.get_feed()], [older.id, fresh.id])
+        posts = self.get_decay_feed()
+        self.assertEqual([p["id"] for p in posts], [fresh.id, older.id])
+        self.assertAlmostEqual(posts[0]["score"], 3, places=2)
+        self.assertAlmostEqual(posts[1]["score"], 4 * 2 ** (-20 / 6), places=2)
+
+    def test_index_is_updated_per_like_and_matches_sql_fallback(self):
+        from django_redis import get_redis_connection
+
+        from feed import decay_index
+        from feed.services import PostService
+
+        fresh, older = self.make_posts()
+        PostService.rebuild_hot_index("decay")
+        LikeFactory(post=older)
+        indexed = self.get_decay_feed()
+        self.assertAlmostEqual(indexed[1]["score"], 1 + 4 * 2 ** (-20 / 6), places=2)
+
+        get_redis_connection("default").delete(decay_index.EPOCH_KEY)
+        from_db = self.get_decay_feed()
+        self.assertEqual([p["id"] for p in from_db], [p["id"] for p in indexed])
+        for db_post, index_post in zip(from_db, indexed):
+            self.assertAlmostEqual(db_post["score"], index_post["score"], places=3)
+
+    def test_renormalize_keeps_scores(self):
+        from feed import decay_index
+        from feed.services import PostService
+
+        self.make_posts()
+        PostService.rebuild_hot_index("decay")
+        before = decay_index.top(10)
+
+        self.assertIsNone(decay_index.renormalize())
+        self.assertEqual(
+            decay_index.renormalize(time.time() + decay_index.HALF_LIFE, 0), 0
+        )
+        for (post_id, score), (same_id, renormalized) in zip(
+            before, decay_index.top(10)
+        ):
+            self.assertEqual(post_id, same_id)
+            self.assertAlmostEqual(score, renormalized, places=3)
+
+    def test_rebuild_command_with_likes(self):
+        from django.core.management import call_command
+
+        from feed import decay_index
+
+        fresh, older = self.make_posts()
+        # entrypoint.sh runs this for every scorer before serving.
+        call_command("rebuild_score_index", stdout=io.StringIO())
+
+        self.assertEqual(
+            [post_id for post_id, _ in decay_index.top(10)], [fresh.id, older.id]
+        )
+        self.assertAlmostEqual(self.get_decay_feed()[0]["score"], 3, places=2)
+
+    def test_invalid_algo_returns_400(self):
+        response = Client().get("/v1/feed/hot?algo=gravity")
+        self.assertEqual(response.status_code, 400)
+        response = Client().get("/v1/feed/hot?algo=decay&cursor=abc")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(HOT_FEED_TOPK=True)
+class ApproxTopKTests(BaseTestCase):
+    def get_approx_feed(self, limit=10):
+        response = Client().get(f"/v1/feed/hot?limit={limit}&algo=approx")
+        return json.loads(response.content)["posts"]
+
+    def test_candidates_are_rescored_exactly(self):
+        from feed import topk
+
+        posts = PostFactory.create_batch(4)
+        for count, post in zip((5, 1, 3, 2), posts):
+            LikeFactory.create_batch(count, post=post)
+
+        self.assertEqual(topk.candidates(2), [posts[0].id, posts[2].id])
+        feed = self.get_approx_feed(3)
+        self.assertEqual(
+            [(p["id"], p["score"]) for p in feed],
+            [(posts[0].id, 5), (posts[2].id, 3), (posts[3].id, 2)],
+        )
+
+    def test_unlike_and_rebuild_from_buckets(self):
+        from feed import topk
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        LikeFactory(post=post, user_id=1)
+        LikeFactory(post=post, user_id=2)
+        LikeService.remove_like(user_id=1, post_id=post.id)
+        self.assertEqual(self.get_approx_feed()[0]["score"], 1)
+
+        topk.clear()
+        self.assertEqual(self.get_approx_feed(), [])
+        PostService.rebuild_hot_index("approx")
+        self.assertEqual(topk.candidates(10), [post.id])
+
+    def test_heavy_hitters_survive_many_light_posts(self):
+        from django.utils import timezone
+
+        from feed import topk
+
+        deltas = {post_id: 1 for post_id in range(1, 20001)}
+        deltas.update({7: 500, 12345: 300})
+        topk.incr(deltas, timezone.now())
+
+        self.assertEqual(topk.candidates(2), [7, 12345])
+
+
+class HotFeedCursorTests(BaseTestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def get_page(self, limit, cursor=None):
+        url = f"/v1/feed/hot?limit={limit}"
+        if cursor is not None:
+            url += f"&cursor={cursor}"
+        return json.loads(Client().get(url).content)
+
+    def walk(self, limit, between_pages=None):
+        page = self.get_page(limit)
+        ids = [p["id"] for p in page["posts"]]
+        while page["next_cursor"] is not None:
+            if between_pages is not None:
+                between_pages()
+            page = self.get_page(limit, page["next_cursor"])
+            ids += [p["id"] for p in page["posts"]]
+        return ids
+
+    def test_pages_are_served_from_one_snapshot(self):
+        from feed.services import LikeService, PostService
+
+        posts = PostFactory.create_batch(5)
+        PostService.rebuild_hot_index()
+        expected = [p["id"] for p in self.get_feed()]
+        user_ids = iter(range(1, 100))
+
+        def like_last_post():
+            LikeService.add_like(user_id=next(user_ids), post_id=posts[0].id)
+
+        self.assertEqual(self.walk(2, like_last_post), expected)
+
+    def expire_snapshots(self):
+        from django_redis import get_redis_connection
+
+        redis = get_redis_connection("default")
+        for key in redis.keys("hotfeed:score:snapshot:*"):
+            redis.delete(key)
+
+    def test_keyset_continues_after_snapshot_expires(self):
+        from feed.services import PostService
+
+        posts = PostFactory.create_batch(5)
+        LikeFactory.create_batch(2, post=posts[3])
+        PostService.rebuild_hot_index()
+        expected = [p["id"] for p in self.get_feed()]
+
+        self.assertEqual(self.walk(2, self.expire_snapshots), expected)
+
+    def test_deep_page_costs_one_query(self):
+        from feed.services import PostService
+
+        PostFactory.create_batch(6)
+        PostService.rebuild_hot_index()
+        cursor = self.get_page(2)["next_cursor"]
+        cursor = self.get_page(2, cursor)["next_cursor"]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get_page(2, cursor)["posts"]), 2)
+
+    def test_keyset_over_sql_fallback(self):
+        posts = PostFactory.create_batch(4)
+        LikeFactory.create_batch(3, post=posts[1])
+        expected = [p["id"] for p in self.get_feed()]
+
+        self.assertEqual(self.walk(1, self.expire_snapshots), expected)
+
+    def test_invalid_cursor_returns_400(self):
+        response = Client().get("/v1/feed/hot?limit=2&cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(LIKE_COUNT_WRITE_BEHIND=True)
+class WriteBehindLikeCountTests(BaseTestCase):
+    def test_likes_are_buffered_and_flushed(self):
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        for user_id in range(1, 4):
+            LikeService.add_like(user_id=user_id, post_id=post.id)
+        LikeService.remove_like(user_id=1, post_id=post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 0)
+        self.assertEqual(PostService.get_post(post.id)["like_count"], 2)
+        self.assertEqual(self.get_feed()[0]["like_count"], 2)
+
+        self.assertEqual(PostService.flush_like_counts(), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 2)
+        self.assertEqual(PostService.get_post(post.id)["like_count"], 2)
+        self.assertEqual(PostService.flush_like_counts(), 0)
+
+    def test_reads_between_commit_and_finish_are_not_kept(self):
+        from feed import like_counts
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+        finish_batch = like_counts.finish_batch
+
+        def read_then_finish():
+            # The batch is committed but still in FLUSHING: counted twice.
+            self.assertEqual(
+                json.loads(PostService.get_post_body(post.id))["like_count"], 2
+            )
+            finish_batch()
+
+        with mock.patch("feed.like_counts.finish_batch", read_then_finish):
+            PostService.flush_like_counts()
+
+        self.assertEqual(
+            json.loads(PostService.get_post_body(post.id))["like_count"], 1
+        )
+
+    def test_batch_is_applied_once_after_a_crash(self):
+        from feed.services import LikeService, PostService
+
+        post = PostFactory()
+        LikeService.add_like(user_id=1, post_id=post.id)
+
+        with mock.patch("feed.like_counts.finish_batch", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                PostService.flush_like_counts()
+        LikeService.add_like(user_id=2, post_id=post.id)
+        self.assertEqual(PostService.get_post(post.id)["like_count"], 3)
+
+        PostService.flush_like_counts()
+        PostService.flush_like_counts()
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 2)
+        self.assertEqual(PostService.get_post(post.id)["like_count"], 2)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"], REPLICA_MAX_LAG=2)
+class ReplicaRoutingTests(BaseTestCase):
+    def setUp(self):
+        from feed import replicas
+
+        super().setUp()
+        replicas.clear_lags()
+        self.addCleanup(replicas.clear_lags)
+
+    def test_lagging_or_failing_replicas_leave_rotation(self):
+        from django.db import DatabaseError
+
+        from feed import replicas
+
+        lags = {"replica1": 0.5, "replica2": 30}
+        with mock.patch("feed.replicas.measure_lag", side_effect=lags.get) as measure:
+            self.assertEqual({replicas.choose_alias() for _ in range(10)}, {"replica1"})
+            self.assertEqual(measure.call_count, 2)
+
+        replicas.clear_lags()
+        with mock.patch("feed.replicas.measure_lag", side_effect=DatabaseError):
+            self.assertEqual(replicas.choose_alias(), "default")
+
+    def test_pinned_clients_and_transactions_read_from_primary(self):
+        from feed import replicas
+
+        with mock.patch("feed.replicas.measure_lag", return_value=0):
+            with replicas.pin_primary():
+                self.assertEqual(replicas.choose_alias(), "default")
+            self.assertIn(replicas.choose_alias(), ["replica1", "replica2"])
+
+            # TestCase wraps every test in a transaction.
+            with replicas.read_replica():
+                self.assertEqual(replicas.current_alias(), "default")
+            self.assertIsNone(replicas.current_alias())
+
+    def test_writes_pin_the_client_to_primary(self):
+        from feed import replicas
+        from feed.middleware import PRIMARY_COOKIE
+
+        post = PostFactory()
+        client = Client()
+        response = client.post(
+            f"/v1/feed/posts/{post.id}/likes/",
+            data=json.dumps({"user_id": 1}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        status_url = f"/v1/feed/posts/{post.id}/likes/1/status/"
+        with mock.patch("feed.replicas.pin_primary", wraps=replicas.pin_primary) as pin:
+            client.get(status_url)
+            pin.assert_called_once_with(True)
+            Client().get(status_url)
+            pin.assert_called_with(False)
+
+
+class ConnectionPoolTests(TestCase):
+    def make_pool(self, size=2, timeout=1, max_lifetime=60, health_check_after=0):
+        import psycopg2
+        from django.db import connection
+
+        from feed.db_pool import ConnectionPool
+
+        params = connection.get_connection_params()
+        pool = ConnectionPool(
+            "test",
+            lambda: psycopg2.connect(**params),
+            size,
+            timeout,
+            max_lifetime,
+            health_check_after,
+        )
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connections_are_reused_and_rolled_back(self):
+        from psycopg2 import extensions
+
+        pool = self.make_pool()
+        first = pool.checkout()
+        with first.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        pool.checkin(first)
+
+        second = pool.checkout()
+        self.assertIs(second, first)
+        self.assertEqual(
+            second.get_transaction_status(), extensions.TRANSACTION_STATUS_IDLE
+        )
+        pool.checkin(second)
+        stats = pool.stats()
+        self.assertEqual(
+            [stats["checkouts"], stats["opened"], stats["idle"], stats["in_use"]],
+            [2, 1, 1, 0],
+        )
+
+    def test_pool_is_bounded(self):
+        from feed.db_pool import PoolTimeout
+
+        pool = self.make_pool(size=1, timeout=0.05)
+        connection = pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+
+    def test_discarded_connections_free_their_slot(self):
+        pool = self.make_pool(size=2, timeout=0.05)
+        for _ in range(5):
+            pool.discard(pool.checkout())
+        self.assertEqual(pool.stats()["discarded"], 5)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        pool.checkin(pool.checkout())
+
+    def test_broken_and_old_connections_are_replaced(self):
+        from django.db import connection
+
+        pool = self.make_pool()
+        broken = pool.checkout()
+        pool.checkin(broken)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_terminate_backend(%s, 5000)", [broken.get_backend_pid()]
+            )
+        # The server closed it; the health check on checkout notices.
+        fresh = pool.checkout()
+        self.assertIsNot(fresh, broken)
+        self.assertEqual(pool.stats()["failed_health_checks"], 1)
+        pool.checkin(fresh)
+
+        pool.max_lifetime = 0
+        self.assertIsNot(pool.checkout(), fresh)
+
+    def test_stats_endpoint_is_for_operators(self):
+        from django.contrib.auth.models import User
+
+        self.assertEqual(Client().get("/v1/feed/db/pool/stats").status_code, 404)
+        with override_settings(DEBUG=True):
+            response = Client().get("/v1/feed/db/pool/stats")
+        self.assertIn("pools", json.loads(response.content))
+
+        User.objects.create_user("ops", password="secret", is_staff=True)
+        client = Client()
+        client.login(username="ops", password="secret")
+        self.assertEqual(client.get("/v1/feed/db/pool/stats").status_code, 200)
@@ -0,0 +1,119 @@
+import random
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+# Approximate heavy hitters over the score window, in fixed memory.
+#
+# Every hour slice has a Count-Min Sketch (DEPTH rows of WIDTH signed 32-bit
+# counters packed in one Redis string, updated with BITFIELD) and a heap of
+# its HEAP_SIZE most-liked posts (a capped sorted set of sketch estimates).
+# Memory is SLICES * (DEPTH * WIDTH * 4 bytes + HEAP_SIZE members), about
+# 1 MB, whatever the number of posts.
+#
+# Error bounds: with N likes in a slice, an estimate exceeds the true count
+# by more than e / WIDTH * N (0.13% of N) with probability at most e ** -DEPTH
+# (0.7%); it never underestimates while likes only grow. A post outside a
+# slice's heap counts 0 for that slice when the window is merged, so
+# candidates() over-fetches and the caller re-scores them exactly.
+WIDTH = 2048
+DEPTH = 5
+HEAP_SIZE = 200
+SLICES = 24
+SLICE_TTL = (SLICES + 1) * 3600
+SKETCH_KEY_TEMPLATE = "hotfeed:topk:sketch:{}"
+HEAP_KEY_TEMPLATE = "hotfeed:topk:heap:{}"
+MERGED_KEY = "hotfeed:topk:merged"
+
+# h(x) = ((a * x + b) mod PRIME) mod WIDTH, one pairwise-independent hash per
+# row. Seeded so every process hashes post ids the same way.
+PRIME = 2 ** 31 - 1
+_rng = random.Random(2019)
+HASHES = [(_rng.randrange(1, PRIME), _rng.randrange(PRIME)) for _ in range(DEPTH)]
+
+INCR_SCRIPT = """
+local depth, heap_size, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+local i = 4
+while i <= #ARGV do
+    local member, delta = ARGV[i], ARGV[i + 1]
+    local ops = {}
+    for row = 1, depth do
+        table.insert(ops, "incrby")
+        table.insert(ops, "i32")
+        table.insert(ops, "#" .. ARGV[i + 1 + row])
+        table.insert(ops, delta)
+    end
+    local estimate = math.min(unpack(redis.call("bitfield", KEYS[1], unpack(ops))))
+    if estimate > 0 then
+        redis.call("zadd", KEYS[2], estimate, member)
+    else
+        redis.call("zrem", KEYS[2], member)
+    end
+    i = i + 2 + depth
+end
+redis.call("zremrangebyrank", KEYS[2], 0, -heap_size - 1)
+redis.call("expire", KEYS[1], ttl)
+redis.call("expire", KEYS[2], ttl)
+return 0
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def enabled():
+    return settings.HOT_FEED_TOPK
+
+
+def slice_id(moment):
+    return int(moment.timestamp()) // 3600
+
+
+def offsets(post_id):
+    """Counter index of ``post_id`` in each sketch row."""
+    return [
+        row * WIDTH + (a * post_id + b) % PRIME % WIDTH
+        for row, (a, b) in enumerate(HASHES)
+    ]
+
+
+def incr(deltas, moment):
+    """Count ``deltas`` (post id -> likes) made at ``moment``."""
+    slice_ = slice_id(moment)
+    if not deltas or slice_ <= slice_id(timezone.now()) - SLICES:
+        return
+
+    args = [DEPTH, HEAP_SIZE, SLICE_TTL]
+    for post_id, delta in deltas.items():
+        args += [post_id, delta, *offsets(post_id)]
+    _redis().register_script(INCR_SCRIPT)(
+        keys=[SKETCH_KEY_TEMPLATE.format(slice_), HEAP_KEY_TEMPLATE.format(slice_)],
+        args=args,
+    )
+
+
+def candidates(count):
+    """Up to ``count`` post ids with the highest estimated window score."""
+    current = slice_id(timezone.now())
+    heaps = [HEAP_KEY_TEMPLATE.format(current - i) for i in range(SLICES)]
+
+    pipe = _redis().pipeline()
+    pipe.zunionstore(MERGED_KEY, heaps, aggregate="SUM")
+    pipe.zrevrange(MERGED_KEY, 0, count - 1)
+    pipe.delete(MERGED_KEY)
+    _, members, _ = pipe.execute()
+    return [int(member) for member in members]
+
+
+def clear():
+    redis = _redis()
+    current = slice_id(timezone.now())
+    redis.delete(
+        *(
+            template.format(current - i)
+            for i in range(SLICES + 1)
+            for template in (SKETCH_KEY_TEMPLATE, HEAP_KEY_TEMPLATE)
+        )
+    )
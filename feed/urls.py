@@ -4,7 +4,11 @@ from . import views
 
 urlpatterns = [
     url(r"^hot$", views.hot_feed, name="hot_feed"),
-    url(r"^posts/$", views.post_create, name="post_create"),
+    url(r"^hot/stats$", views.hot_feed_stats, name="hot_feed_stats"),
+    url(r"^db/pool/stats$", views.db_pool_stats, name="db_pool_stats"),
+    url(r"^likes/batch$", views.like_batch, name="like_batch"),
+    url(r"^posts/$", views.posts, name="posts"),
+    url(r"^posts/aggregates/$", views.posts_aggregates, name="posts_aggregates"),
     url(r"^posts/(?P<post_id>[0-9]+)/$", views.post_detail, name="post_detail"),
     url(r"^posts/(?P<post_id>[0-9]+)/update/$", views.post_update, name="post_update"),
     url(r"^posts/(?P<post_id>[0-9]+)/delete/$", views.post_delete, name="post_delete"),
@@ -1,4 +1,18 @@
+import base64
+import binascii
+import json
+
+from django.utils.dateparse import parse_datetime
+
 from .exceptions import ValidationError
+from .scorers import SCORERS
+
+MAX_LIKE_COUNT_SHARDS = 64
+MAX_LIKE_BATCH_SIZE = 10000
+MAX_POST_IDS = 100
+# feed_like partitions to keep: the hot window spans today and yesterday.
+MIN_LIKE_RETENTION_DAYS = 2
+MAX_COMPACTION_BATCH_SIZE = 100000
 
 
 def validate_user_id(user_id):
@@ -16,6 +30,84 @@ def validate_user_id(user_id):
     return user_id
 
 
+def validate_like_batch(data):
+    if not isinstance(data, dict) or not isinstance(data.get("likes"), list):
+        raise ValidationError("likes must be a list")
+
+    likes = data["likes"]
+    if not likes:
+        raise ValidationError("likes cannot be empty")
+
+    if len(likes) > MAX_LIKE_BATCH_SIZE:
+        raise ValidationError(f"likes cannot exceed {MAX_LIKE_BATCH_SIZE} items")
+
+    pairs = []
+    for index, item in enumerate(likes):
+        if not isinstance(item, dict):
+            raise ValidationError(f"likes[{index}] must be an object")
+
+        try:
+            post_id = int(item.get("post_id"))
+        except (ValueError, TypeError):
+            raise ValidationError(f"likes[{index}]: post_id must be an integer")
+
+        try:
+            user_id = validate_user_id(item.get("user_id"))
+        except ValidationError as e:
+            raise ValidationError(f"likes[{index}]: {e}")
+
+        pairs.append((post_id, user_id))
+
+    return pairs
+
+
+def validate_algo(algo):
+    if algo not in SCORERS:
+        raise ValidationError(f"algo must be one of: {', '.join(SCORERS)}")
+
+    return algo
+
+
+def validate_post_ids(ids):
+    if not ids:
+        raise ValidationError("ids is required")
+
+    try:
+        post_ids = [int(post_id) for post_id in ids.split(",")]
+    except ValueError:
+        raise ValidationError("ids must be a comma-separated list of integers")
+
+    post_ids = list(dict.fromkeys(post_ids))
+    if len(post_ids) > MAX_POST_IDS:
+        raise ValidationError(f"ids cannot exceed {MAX_POST_IDS} items")
+
+    return post_ids
+
+
+def validate_like_retention(retain_days):
+    if retain_days < MIN_LIKE_RETENTION_DAYS:
+        raise ValidationError(
+            f"retain_days must be at least {MIN_LIKE_RETENTION_DAYS}"
+        )
+
+    return retain_days
+
+
+def validate_like_compaction(older_than_days, batch_size):
+    # Likes still in the score window are needed for their created_at.
+    if older_than_days < MIN_LIKE_RETENTION_DAYS:
+        raise ValidationError(
+            f"older_than_days must be at least {MIN_LIKE_RETENTION_DAYS}"
+        )
+
+    if not 1 <= batch_size <= MAX_COMPACTION_BATCH_SIZE:
+        raise ValidationError(
+            f"batch_size must be between 1 and {MAX_COMPACTION_BATCH_SIZE}"
+        )
+
+    return older_than_days, batch_size
+
+
 def validate_post_data(data):
     if not isinstance(data, dict):
         raise ValidationError("data must be a dictionary")
@@ -36,6 +128,18 @@ def validate_post_data(data):
     return validated_data
 
 
+def validate_like_count_shards(shards):
+    try:
+        shards = int(shards)
+    except (ValueError, TypeError):
+        raise ValidationError("shards must be an integer")
+
+    if not 1 <= shards <= MAX_LIKE_COUNT_SHARDS:
+        raise ValidationError(f"shards must be between 1 and {MAX_LIKE_COUNT_SHARDS}")
+
+    return shards
+
+
 def validate_pagination(limit, offset=0):
     try:
         limit = int(limit)
@@ -57,3 +161,25 @@ def validate_pagination(limit, offset=0):
         raise ValidationError("offset cannot be negative")
 
     return limit, offset
+
+
+def validate_cursor(cursor):
+    if cursor is None:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        version, position = payload["v"], int(payload["p"])
+        score, created_at, post_id = payload["k"]
+        after = int(score), parse_datetime(created_at), int(post_id)
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise ValidationError("cursor is invalid")
+
+    if version is not None and not isinstance(version, str):
+        raise ValidationError("cursor is invalid")
+
+    if after[1] is None or position < 0:
+        raise ValidationError("cursor is invalid")
+
+    return {"version": version, "position": position, "after": after}
@@ -1,55 +1,192 @@
+import hashlib
 import json
 from http.client import BAD_REQUEST, OK, CREATED, NOT_FOUND, INTERNAL_SERVER_ERROR, NO_CONTENT
 
+from django.conf import settings
 from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
 from .cache import (
+    FEED_CACHE_CONTROL,
     acquire_lock,
+    feed_etag,
+    get_cached_body,
     get_cached_feed,
+    get_feed_generation,
+    get_fresh_version,
+    get_l1_stats,
     release_lock,
+    set_cached_body,
     set_cached_feed,
     wait_for_cache,
 )
+from .db_pool import get_pool_stats
 from .exceptions import (
     LikeNotFoundError,
     PostNotFoundError,
     ValidationError,
 )
+from .post_cache import AGGREGATES_TTL
+from .scorers import DEFAULT_SCORER
 from .services import LikeService, PostService
-from .validators import validate_pagination
+from .validators import (
+    validate_algo,
+    validate_cursor,
+    validate_pagination,
+    validate_user_id,
+)
+
+# Posts change with every like and the post cache drops them on every write,
+# so clients always revalidate, as they do for a stale feed; aggregates may
+# lag by AGGREGATES_TTL anyway.
+REVALIDATE_CACHE_CONTROL = "no-cache"
+AGGREGATES_CACHE_CONTROL = f"max-age={AGGREGATES_TTL}"
+
+
+def _content_etag(body):
+    return quote_etag(hashlib.md5(body).hexdigest())
+
+
+def _with_validators(response, etag, cache_control):
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def _not_modified(request, etag, cache_control):
+    """A 304 if the client's If-None-Match still matches ``etag``, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return _with_validators(response, etag, cache_control)
+
+
+def _cacheable_json(request, body, etag, cache_control):
+    """Stored JSON ``body`` with its validators, or a 304 if the client has it."""
+    response = _not_modified(request, etag, cache_control)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+        _with_validators(response, etag, cache_control)
+    return response
 
 
 def hot_feed(request):
     try:
         limit_param = request.GET.get("limit", 50)
         limit, _ = validate_pagination(limit_param)
+        cursor = validate_cursor(request.GET.get("cursor"))
+        user_id = request.GET.get("user_id")
+        if user_id is not None:
+            user_id = validate_user_id(user_id)
+        algo = validate_algo(request.GET.get("algo", DEFAULT_SCORER))
+        if algo != DEFAULT_SCORER and cursor is not None:
+            raise ValidationError(f"cursor is not supported for algo={algo}")
     except ValidationError as e:
         return JsonResponse({"error": str(e)}, status=BAD_REQUEST)
 
-    cached = get_cached_feed(limit)
-    if cached is not None:
-        return JsonResponse({"posts": cached})
+    if algo != DEFAULT_SCORER:
+        page = PostService.list_hot_scored_page(limit, algo)
+        if user_id is not None:
+            LikeService.mark_liked(page["posts"], user_id)
+        return JsonResponse(page)
+
+    if cursor is not None:
+        page = PostService.list_hot_page(limit, cursor)
+        if user_id is not None:
+            LikeService.mark_liked(page["posts"], user_id)
+        return JsonResponse(page)
+
+    if user_id is None and "HTTP_IF_NONE_MATCH" in request.META:
+        # Revalidation needs only the feed version, not the body.
+        version = get_fresh_version(limit)
+        if version is not None:
+            response = _not_modified(
+                request, feed_etag(version, limit), FEED_CACHE_CONTROL
+            )
+            if response is not None:
+                return response
+
+    body, version, fresh = _shared_hot_feed_body(limit)
+    if user_id is None:
+        # A stale or just rebuilt body may still be the one the client has.
+        cache_control = FEED_CACHE_CONTROL if fresh else REVALIDATE_CACHE_CONTROL
+        etag = feed_etag(version, limit)
+        return _cacheable_json(request, body, etag, cache_control)
 
-    if acquire_lock(limit):
-        try:
-            cached = get_cached_feed(limit)
-            if cached is not None:
-                return JsonResponse({"posts": cached})
+    # The cached body stays user-agnostic; flags go onto a private copy.
+    page = json.loads(body)
+    LikeService.mark_liked(page["posts"], user_id)
+    return JsonResponse(page)
 
-            result = PostService.list_hot_posts(limit)
-            set_cached_feed(limit, result)
-            return JsonResponse({"posts": result})
-        finally:
-            release_lock(limit)
-    else:
-        cached = wait_for_cache(limit)
-        if cached is not None:
-            return JsonResponse({"posts": cached})
 
-        result = PostService.list_hot_posts(limit)
-        return JsonResponse({"posts": result})
+def _shared_hot_feed_body(limit):
+    """``(body, version, fresh)`` of the shared feed page for ``limit``."""
+    body, version, fresh = get_cached_body(limit)
+    if body is not None and fresh:
+        return body, version, True
+
+    feed, fresh = get_cached_feed()
+    if feed is None or not fresh:
+        if acquire_lock():
+            try:
+                feed, fresh = get_cached_feed()
+                if feed is None or not fresh:
+                    generation = get_feed_generation()
+                    feed = PostService.build_hot_feed()
+                    set_cached_feed(feed, generation)
+                    fresh = True
+            finally:
+                release_lock()
+        elif body is not None:
+            # Someone else is refreshing: serve the stale body meanwhile.
+            return body, version, False
+        elif feed is None:
+            feed = wait_for_cache()
+            if feed is None:
+                feed = PostService.build_hot_feed()
+            fresh = True
+        # Otherwise the stale feed is rendered, and the body stays stale.
+
+    body = json.dumps(PostService.hot_feed_page(feed, limit)).encode()
+    set_cached_body(limit, feed["version"], body)
+    return body, feed["version"], fresh
+
+
+@require_http_methods(["GET"])
+def hot_feed_stats(request):
+    return JsonResponse({"l1": get_l1_stats()}, status=OK)
+
+
+@require_http_methods(["GET"])
+def db_pool_stats(request):
+    # Pool internals are for operators: DEBUG builds or staff sessions only.
+    if not (settings.DEBUG or request.user.is_staff):
+        return JsonResponse({"error": "Not found"}, status=NOT_FOUND)
+    return JsonResponse({"pools": get_pool_stats()}, status=OK)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def posts(request):
+    if request.method == "GET":
+        return post_list(request)
+    return post_create(request)
+
+
+@require_http_methods(["GET"])
+def post_list(request):
+    try:
+        result = PostService.get_posts(request.GET.get("ids"))
+        return JsonResponse(result, status=OK)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=BAD_REQUEST)
+    except Exception:
+        return JsonResponse(
+            {"error": "Internal server error"}, status=INTERNAL_SERVER_ERROR
+        )
 
 
 @csrf_exempt
@@ -72,8 +209,10 @@ def post_create(request):
 @require_http_methods(["GET"])
 def post_detail(request, post_id):
     try:
-        post = PostService.get_post(post_id)
-        return JsonResponse(post, status=OK)
+        body = PostService.get_post_body(post_id)
+        return _cacheable_json(
+            request, body, _content_etag(body), REVALIDATE_CACHE_CONTROL
+        )
     except PostNotFoundError as e:
         return JsonResponse({"error": str(e)}, status=NOT_FOUND)
     except Exception:
@@ -111,11 +250,26 @@ def post_delete(request, post_id):
         return JsonResponse({"error": "Internal server error"}, status=INTERNAL_SERVER_ERROR)
 
 
+@require_http_methods(["GET"])
+def posts_aggregates(request):
+    try:
+        result = PostService.get_posts_aggregates(request.GET.get("ids"))
+        return JsonResponse(result, status=OK)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=BAD_REQUEST)
+    except Exception:
+        return JsonResponse(
+            {"error": "Internal server error"}, status=INTERNAL_SERVER_ERROR
+        )
+
+
 @require_http_methods(["GET"])
 def post_aggregates(request, post_id):
     try:
-        aggregates = PostService.get_post_aggregates(post_id)
-        return JsonResponse(aggregates, status=OK)
+        body = PostService.get_post_aggregates_body(post_id)
+        return _cacheable_json(
+            request, body, _content_etag(body), AGGREGATES_CACHE_CONTROL
+        )
     except PostNotFoundError as e:
         return JsonResponse({"error": str(e)}, status=NOT_FOUND)
     except Exception:
@@ -146,6 +300,25 @@ def like_create(request, post_id):
         return JsonResponse({"error": "Internal server error"}, status=INTERNAL_SERVER_ERROR)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def like_batch(request):
+    try:
+        data = json.loads(request.body.decode("utf-8")) if request.body else {}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "Invalid JSON"}, status=BAD_REQUEST)
+
+    try:
+        result = LikeService.add_likes(data)
+        return JsonResponse(result, status=OK)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=BAD_REQUEST)
+    except Exception:
+        return JsonResponse(
+            {"error": "Internal server error"}, status=INTERNAL_SERVER_ERROR
+        )
+
+
 @csrf_exempt
 @require_http_methods(["DELETE"])
 def like_delete(request, post_id, user_id):
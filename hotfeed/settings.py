@@ -28,6 +28,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "feed.middleware.ReplicaStickinessMiddleware",
 ]
 
 ROOT_URLCONF = "hotfeed.urls"
@@ -51,17 +52,54 @@ TEMPLATES = [
 WSGI_APPLICATION = "hotfeed.wsgi.application"
 
 
+# Connections come from a per-process pool (feed.db_pool) of POOL "SIZE"
+# connections; Django hands them back after each request, so CONN_MAX_AGE
+# stays 0. Behind PgBouncer in transaction mode set DB_PGBOUNCER=True:
+# server-side cursors do not survive between transactions there.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "feed.db_backend",
         "NAME": os.environ.get("DB_NAME", "hotfeed"),
         "USER": os.environ.get("DB_USER", "postgres"),
         "PASSWORD": os.environ.get("DB_PASSWORD", "postgres"),
         "HOST": os.environ.get("DB_HOST", "localhost"),
         "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": 0,
+        "DISABLE_SERVER_SIDE_CURSORS": (
+            os.environ.get("DB_PGBOUNCER", "False") == "True"
+        ),
+        "POOL": {
+            "SIZE": int(os.environ.get("DB_POOL_SIZE", "10")),
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", "5")),
+            "MAX_LIFETIME": float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800")),
+            "HEALTH_CHECK_AFTER": 1.0,
+        },
     }
 }
 
+# Streaming replicas for read-only queries, as "host[:port],host[:port]".
+# Tests mirror them to the default database.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    host, _, port = address.partition(":")
+    DATABASES[f"replica{number}"] = dict(
+        DATABASES["default"],
+        HOST=host,
+        PORT=port or DATABASES["default"]["PORT"],
+        OPTIONS={"connect_timeout": 2},
+        TEST={"MIRROR": "default"},
+    )
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["feed.routers.ReplicaRouter"]
+
+# Replicas further behind than this many seconds get no reads.
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", "2"))
+# How long a client reads from the primary after it wrote.
+REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,3 +145,11 @@ CACHES = {
         "TIMEOUT": 300,
     }
 }
+
+
+# Buffer like_count deltas in Redis and let `manage.py flush_like_counts`
+# apply them to feed_post in batches.
+LIKE_COUNT_WRITE_BEHIND = os.environ.get("LIKE_COUNT_WRITE_BEHIND", "False") == "True"
+
+# Feed likes into the Count-Min Sketch top-K behind `/v1/feed/hot?algo=approx`.
+HOT_FEED_TOPK = os.environ.get("HOT_FEED_TOPK", "False") == "True"